@@ -0,0 +1,52 @@
+import concurrent.futures
+import logging
+import threading
+
+
+class BackgroundWorker:
+    """
+    Runs local work (cache writes, report parsing, farm analytics) on a single
+    worker thread. Jobs run one at a time in the order they were submitted
+    while the main thread waits out the delay before its next request.
+    """
+
+    logger = logging.getLogger("Background")
+
+    def __init__(self):
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="TWB-Background"
+        )
+        self.pending = set()
+        self.lock = threading.Lock()
+
+    def call(self, func, args, kwargs):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            self.logger.warning(
+                "Background job %s failed: %s" % (getattr(func, "__name__", func), e)
+            )
+            return None
+
+    def submit(self, func, *args, **kwargs):
+        future = self.executor.submit(self.call, func, args, kwargs)
+        with self.lock:
+            self.pending.add(future)
+        future.add_done_callback(self.done)
+        return future
+
+    def done(self, future):
+        with self.lock:
+            self.pending.discard(future)
+
+    def drain(self, timeout=None):
+        """
+        Blocks until all submitted jobs are finished
+        """
+        with self.lock:
+            waiting = list(self.pending)
+        if waiting:
+            concurrent.futures.wait(waiting, timeout=timeout)
+
+    def stop(self):
+        self.executor.shutdown(wait=True)
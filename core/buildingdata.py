@@ -0,0 +1,159 @@
+import logging
+import sys
+from array import array
+
+# Standard building configuration (as returned by interface.php?func=get_building_info):
+# max level, base wood / stone / iron, base pop,
+# wood / stone / iron factor, pop factor, base build time (s), build time factor
+BUILDINGS = {
+    "main": (30, 90, 80, 70, 5, 1.26, 1.275, 1.26, 1.17, 900, 1.2),
+    "barracks": (25, 200, 170, 90, 7, 1.26, 1.28, 1.26, 1.17, 1800, 1.2),
+    "stable": (20, 270, 240, 260, 8, 1.26, 1.28, 1.26, 1.17, 6000, 1.2),
+    "garage": (15, 300, 240, 260, 8, 1.26, 1.28, 1.26, 1.17, 6000, 1.2),
+    "church": (3, 16000, 20000, 5000, 5000, 1.26, 1.28, 1.26, 1.55, 184980, 1.2),
+    "church_f": (1, 160, 200, 50, 5, 1.26, 1.28, 1.26, 1.55, 8160, 1.2),
+    "watchtower": (20, 12000, 14000, 10000, 500, 1.17, 1.17, 1.18, 1.18, 13200, 1.2),
+    "snob": (3, 15000, 25000, 10000, 80, 2.0, 2.0, 2.0, 1.17, 586800, 1.2),
+    "smith": (20, 220, 180, 240, 20, 1.26, 1.275, 1.26, 1.17, 6000, 1.2),
+    "place": (1, 10, 40, 30, 0, 1.26, 1.275, 1.26, 1.17, 10860, 1.2),
+    "statue": (1, 220, 220, 220, 10, 1.26, 1.275, 1.26, 1.17, 1500, 1.2),
+    "market": (25, 100, 100, 100, 20, 1.26, 1.275, 1.26, 1.17, 2700, 1.2),
+    "wood": (30, 50, 60, 40, 5, 1.25, 1.275, 1.245, 1.155, 900, 1.2),
+    "stone": (30, 65, 50, 40, 10, 1.27, 1.265, 1.24, 1.14, 900, 1.2),
+    "iron": (30, 75, 65, 70, 10, 1.252, 1.275, 1.24, 1.17, 1080, 1.2),
+    "farm": (30, 45, 40, 30, 0, 1.3, 1.32, 1.29, 1.0, 1200, 1.2),
+    "storage": (30, 60, 50, 40, 0, 1.265, 1.27, 1.245, 1.15, 1020, 1.2),
+    "hide": (10, 50, 60, 50, 2, 1.25, 1.25, 1.25, 1.17, 1800, 1.2),
+    "wall": (20, 50, 100, 20, 5, 1.26, 1.275, 1.26, 1.17, 3600, 1.2),
+}
+
+
+class BuildingTable:
+    """
+    Per-level tables of a single building, index = level (index 0 is unused / zero)
+    wood, stone and iron are the cost of the upgrade to a level,
+    population is the total population the building uses at a level
+    """
+
+    def __init__(self, name, spec):
+        (
+            max_level,
+            wood,
+            stone,
+            iron,
+            pop,
+            wood_factor,
+            stone_factor,
+            iron_factor,
+            pop_factor,
+            build_time,
+            build_time_factor,
+        ) = spec
+        self.name = name
+        self.max_level = max_level
+        levels = range(max_level + 1)
+        self.wood = array("i", [round(wood * wood_factor ** (x - 1)) if x else 0 for x in levels])
+        self.stone = array("i", [round(stone * stone_factor ** (x - 1)) if x else 0 for x in levels])
+        self.iron = array("i", [round(iron * iron_factor ** (x - 1)) if x else 0 for x in levels])
+        self.population = array("i", [round(pop * pop_factor ** (x - 1)) if x else 0 for x in levels])
+        # base build time at headquarters level 0 on a speed 1 world
+        self.build_time = array(
+            "d", [build_time * 1.18 * build_time_factor ** (x - 13) if x else 0 for x in levels]
+        )
+
+    def pop_cost(self, level):
+        """
+        Additional population required for the upgrade to a level
+        """
+        return self.population[level] - self.population[level - 1]
+
+
+class BuildingData:
+    """
+    Building cost / population / build time tables computed from the game formulas.
+    Tables are built once per process and shared, lookups are plain array indexing.
+    """
+
+    tables = None
+    logger = logging.getLogger("BuildingData")
+
+    @staticmethod
+    def get_tables():
+        if BuildingData.tables is None:
+            BuildingData.tables = {
+                name: BuildingTable(name, spec) for name, spec in BUILDINGS.items()
+            }
+        return BuildingData.tables
+
+    @staticmethod
+    def table(building):
+        return BuildingData.get_tables().get(building)
+
+    @staticmethod
+    def max_level(building):
+        table = BuildingData.table(building)
+        return table.max_level if table else 0
+
+    @staticmethod
+    def clamp(table, level):
+        return max(0, min(int(level), table.max_level))
+
+    @staticmethod
+    def cost(building, level):
+        """
+        Returns a dict with the wood, stone, iron and pop required for the upgrade to level
+        """
+        table = BuildingData.table(building)
+        if not table or level < 1 or level > table.max_level:
+            return None
+        return {
+            "wood": table.wood[level],
+            "stone": table.stone[level],
+            "iron": table.iron[level],
+            "pop": table.pop_cost(level),
+        }
+
+    @staticmethod
+    def population(building, level):
+        table = BuildingData.table(building)
+        if not table:
+            return 0
+        return table.population[BuildingData.clamp(table, level)]
+
+    @staticmethod
+    def build_time(building, level, main_level=1, speed=1.0):
+        """
+        Estimated build time in seconds of the upgrade to level
+        """
+        table = BuildingData.table(building)
+        if not table or level < 1 or level > table.max_level:
+            return None
+        return table.build_time[level] * 1.05 ** (-int(main_level)) / speed
+
+    @staticmethod
+    def cross_check(world):
+        """
+        Compares the computed population tables against twstats.com (requires network)
+        Returns a list of (building, level, computed, twstats) mismatches
+        """
+        from core.twstats import TwStats
+
+        mismatches = []
+        remote = TwStats().get_building_data(world=world)
+        for building, levels in remote.items():
+            for level, population in levels.items():
+                computed = BuildingData.population(building, int(level))
+                if computed != int(population):
+                    mismatches.append((building, int(level), computed, int(population)))
+        return mismatches
+
+
+if __name__ == "__main__":
+    # python -m core.buildingdata <world>: cross-check against twstats.com
+    if len(sys.argv) < 2:
+        print("Usage: python -m core.buildingdata <world>")
+        sys.exit(1)
+    found = BuildingData.cross_check(world=sys.argv[1])
+    for entry in found:
+        print("%s level %d: computed %d, twstats %d" % entry)
+    print("%d mismatches" % len(found))
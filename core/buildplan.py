@@ -0,0 +1,113 @@
+from core.buildingdata import BuildingData
+
+
+class BuildTemplate:
+    """
+    A builder template compiled to (building, target level) steps with the
+    cost of every step precomputed. Compiled templates are shared by all villages.
+    """
+
+    compiled = {}
+
+    def __init__(self, steps):
+        self.steps = tuple(steps)
+        self.requirements = tuple(BuildingData.cost(b, level) for b, level in self.steps)
+
+    def __len__(self):
+        return len(self.steps)
+
+    @staticmethod
+    def compile(lines):
+        """
+        Compiles the lines of a builder template (building:level), cached per template content
+        """
+        key = tuple(lines)
+        if key not in BuildTemplate.compiled:
+            steps = []
+            for line in key:
+                if line.startswith("#") or ":" not in line:
+                    continue
+                building, level = line.split(":", 1)
+                steps.append((building, int(level)))
+            BuildTemplate.compiled[key] = BuildTemplate(steps)
+        return BuildTemplate.compiled[key]
+
+
+class BuildPlan:
+    """
+    Progress of a single village through a compiled template.
+    The cursor only moves forward, so finding the next unmet step is amortized O(1).
+    Priority steps (storage / farm) are handled before the template.
+    """
+
+    def __init__(self, template):
+        self.template = template
+        self.cursor = 0
+        self.inserts = []
+        self.dropped = set()
+
+    @staticmethod
+    def met(step, levels):
+        building, level = step
+        return int(levels.get(building, 0)) >= level
+
+    def advance(self, levels):
+        steps = self.template.steps
+        while self.cursor < len(steps) and (
+            self.cursor in self.dropped or self.met(steps[self.cursor], levels)
+        ):
+            self.cursor += 1
+        self.inserts = [step for step in self.inserts if not self.met(step, levels)]
+
+    def pending(self, levels):
+        """
+        Yields (index, step) for every unmet step, index is None for priority steps
+        """
+        self.advance(levels)
+        for step in list(self.inserts):
+            if not self.met(step, levels):
+                yield None, step
+        steps = self.template.steps
+        for index in range(self.cursor, len(steps)):
+            if index not in self.dropped and not self.met(steps[index], levels):
+                yield index, steps[index]
+
+    def lookahead(self, levels, count):
+        """
+        Buildings of the next count unmet steps
+        """
+        output = []
+        for _, (building, _) in self.pending(levels):
+            if len(output) >= count:
+                break
+            output.append(building)
+        return output
+
+    def requirement(self, index, step, levels):
+        """
+        Cost of the next upgrade towards a step, precomputed for single level steps
+        """
+        building, level = step
+        current = int(levels.get(building, 0))
+        if index is not None and level == current + 1:
+            return self.template.requirements[index]
+        return BuildingData.cost(building, current + 1)
+
+    def prioritize(self, building, level):
+        if (building, level) not in self.inserts:
+            self.inserts.insert(0, (building, level))
+
+    def drop(self, index, step):
+        if index is None:
+            if step in self.inserts:
+                self.inserts.remove(step)
+        else:
+            self.dropped.add(index)
+
+    def remaining(self, levels):
+        return ["%s:%d" % step for _, step in self.pending(levels)]
+
+    def has_pending(self, levels):
+        for _ in self.pending(levels):
+            return True
+        return False
@@ -0,0 +1,176 @@
+import gzip
+import json
+import logging
+import os
+import sys
+import time
+
+try:
+    import orjson
+
+    has_orjson = True
+except ImportError:
+    has_orjson = False
+
+try:
+    import ujson
+
+    has_ujson = True
+except ImportError:
+    has_ujson = False
+
+
+class StdlibCodec:
+    """
+    Reference codec, always available and used whenever a faster backend refuses a payload
+    """
+
+    name = "json"
+
+    @staticmethod
+    def loads(data):
+        return json.loads(data, strict=False)
+
+    @staticmethod
+    def dumps(entry):
+        return json.dumps(entry)
+
+
+class OrjsonCodec(StdlibCodec):
+    name = "orjson"
+
+    @staticmethod
+    def loads(data):
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson is strict about control characters inside strings
+            return StdlibCodec.loads(data)
+
+    @staticmethod
+    def dumps(entry):
+        try:
+            return orjson.dumps(entry, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+        except TypeError:
+            return StdlibCodec.dumps(entry)
+
+
+class UjsonCodec(StdlibCodec):
+    name = "ujson"
+
+    @staticmethod
+    def loads(data):
+        try:
+            return ujson.loads(data)
+        except ValueError:
+            return StdlibCodec.loads(data)
+
+    @staticmethod
+    def dumps(entry):
+        try:
+            return ujson.dumps(entry, escape_forward_slashes=False)
+        except (TypeError, OverflowError):
+            return StdlibCodec.dumps(entry)
+
+
+CODECS = {"json": StdlibCodec}
+if has_orjson:
+    CODECS["orjson"] = OrjsonCodec
+if has_ujson:
+    CODECS["ujson"] = UjsonCodec
+
+# fastest available backend first
+active = CODECS.get("orjson") or CODECS.get("ujson") or StdlibCodec
+
+
+def use(name):
+    """
+    Selects a backend by name, unknown or missing backends fall back to the stdlib
+    """
+    global active
+    if name not in CODECS:
+        logging.getLogger("Codec").warning(
+            "JSON backend %s is not available, using %s" % (name, StdlibCodec.name)
+        )
+    active = CODECS.get(name, StdlibCodec)
+    return active
+
+
+def loads(data):
+    return active.loads(data)
+
+
+def dumps(entry):
+    return active.dumps(entry)
+
+
+def load(f):
+    return active.loads(f.read())
+
+
+def dump(entry, f):
+    f.write(active.dumps(entry))
+
+
+def sample_payloads(archive=None):
+    """
+    Map sectors and game data from a recorded session (or a synthetic map payload)
+    and the cached reports of the bot
+    """
+    payloads = []
+    reports = os.path.join(os.path.dirname(__file__), "..", "cache", "reports")
+    if os.path.isdir(reports):
+        for existing in sorted(os.listdir(reports))[:1000]:
+            if existing.endswith(".json"):
+                with open(os.path.join(reports, existing), "r", encoding="utf-8") as f:
+                    payloads.append(("report", f.read()))
+    if archive:
+        from core.page import ParsedPage
+
+        with gzip.open(archive, "rt", encoding="utf-8") as f:
+            for line in f:
+                page = ParsedPage(json.loads(line)["text"])
+                for name in ["map", "game_state"]:
+                    raw = page.group(name)
+                    if raw:
+                        payloads.append((name, raw))
+        return payloads
+    sectors = []
+    for sector in range(16):
+        villages = {
+            str(x): {
+                str(y): [str(sector * 1000 + x * 20 + y), 0, "Village %d" % y, "512", "0", "100"]
+                for y in range(20)
+            }
+            for x in range(20)
+        }
+        sectors.append({"x": sector * 20, "y": 500, "data": {"villages": villages}})
+    payloads.append(("map", json.dumps(sectors)))
+    return payloads
+
+
+def benchmark(payloads, rounds=20):
+    size = sum(len(raw) for _, raw in payloads) * rounds / (1024 * 1024)
+    decoded = [StdlibCodec.loads(raw) for _, raw in payloads]
+    for codec in CODECS.values():
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for _, raw in payloads:
+                codec.loads(raw)
+        loading = time.perf_counter() - started
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for entry in decoded:
+                codec.dumps(entry)
+        dumping = time.perf_counter() - started
+        print(
+            "%-7s loads %8.2f MB/s   dumps %8.2f MB/s"
+            % (codec.name, size / loading, size / dumping)
+        )
+
+
+if __name__ == "__main__":
+    # python -m core.codec [archive.jsonl.gz]
+    loaded = sample_payloads(sys.argv[1] if len(sys.argv) > 1 else None)
+    print("%d payloads, active backend: %s" % (len(loaded), active.name))
+    benchmark(loaded)
@@ -0,0 +1,183 @@
+import json
+import re
+import sys
+import time
+from json.decoder import scanstring
+
+# JSON compatible values (the common case) are decoded by the C scanner of the stdlib
+DECODER = json.JSONDecoder(strict=False)
+SCAN_ONCE = DECODER.scan_once
+
+WHITESPACE = re.compile(r"(?:\s+|//[^\n]*|/\*(?:[^*]|\*(?!/))*\*/)*")
+SPACE = frozenset(" \t\n\r/")
+# key and colon in one match: identifier / number, double quoted or single quoted
+KEY = re.compile(
+    r"""\s*(?:([A-Za-z_$][\w$]*|\d+)|"((?:[^"\\]|\\.)*)"|'((?:[^'\\]|\\.)*)')\s*:\s*"""
+)
+IDENTIFIER = re.compile(r"[A-Za-z_$][\w$]*")
+SINGLE_QUOTED = re.compile(r"'((?:[^'\\]|\\.)*)'", re.DOTALL)
+# escaped characters (kept as they are) and bare double quotes of single quoted strings
+QUOTE_ESCAPE = re.compile(r'\\.|"', re.DOTALL)
+LITERALS = {"true": True, "false": False, "null": None, "undefined": None}
+
+
+class JSObjectError(ValueError):
+    def __init__(self, message, text, index):
+        ValueError.__init__(self, "%s at char %d" % (message, index))
+        self.index = index
+        self.snippet = text[index : index + 40]
+
+
+def skip(text, index):
+    if text[index : index + 1] in SPACE:
+        return WHITESPACE.match(text, index).end()
+    return index
+
+
+def requote(found):
+    escape = found.group(0)
+    if escape == '"':
+        return '\\"'
+    if escape == "\\'":
+        return "'"
+    return escape
+
+
+def unescape(raw, quote):
+    if quote == "'":
+        raw = QUOTE_ESCAPE.sub(requote, raw)
+    elif "\\" not in raw:
+        return raw
+    # decode the escapes as a double quoted json string
+    return scanstring('"%s"' % raw, 1, False)[0]
+
+
+def parse_object(text, index):
+    result = {}
+    index += 1
+    match_key = KEY.match
+    while True:
+        found = match_key(text, index)
+        if found is None:
+            index = skip(text, index)
+            if text[index : index + 1] == "}":
+                return result, index + 1
+            found = match_key(text, index)
+            if found is None:
+                raise JSObjectError("Expecting property name", text, index)
+        key = found.group(1)
+        if key is None:
+            if found.group(2) is not None:
+                key = unescape(found.group(2), '"')
+            else:
+                key = unescape(found.group(3), "'")
+        index = found.end()
+        if text[index : index + 1] in "{['":
+            value, index = parse_at(text, index)
+        else:
+            try:
+                value, index = SCAN_ONCE(text, index)
+            except (StopIteration, ValueError):
+                value, index = parse_at(text, index)
+        result[key] = value
+        char = text[index : index + 1]
+        if char != ",":
+            index = skip(text, index)
+            char = text[index : index + 1]
+            if char == "}":
+                return result, index + 1
+            if char != ",":
+                raise JSObjectError("Expecting ',' or '}'", text, index)
+        index += 1
+
+
+def parse_array(text, index):
+    result = []
+    index = skip(text, index + 1)
+    while text[index : index + 1] != "]":
+        value, index = parse_at(text, index)
+        result.append(value)
+        index = skip(text, index)
+        char = text[index : index + 1]
+        if char == ",":
+            index = skip(text, index + 1)
+        elif char != "]":
+            raise JSObjectError("Expecting ',' or ']'", text, index)
+    return result, index + 1
+
+
+def parse_at(text, index=0):
+    """
+    Parses the JS object literal starting at index (leading whitespace is skipped)
+    Returns the value and the index right after it, like JSONDecoder.raw_decode
+    Accepts unquoted keys, single quoted strings, trailing commas and comments
+    """
+    index = skip(text, index)
+    char = text[index : index + 1]
+    if char == "{":
+        # objects with quoted keys are most likely plain json
+        start = skip(text, index + 1)
+        if text[start : start + 1] in ('"', "}"):
+            try:
+                return SCAN_ONCE(text, index)
+            except (StopIteration, ValueError):
+                pass
+        return parse_object(text, index)
+    if char == "'":
+        found = SINGLE_QUOTED.match(text, index)
+        if not found:
+            raise JSObjectError("Unterminated string", text, index)
+        return unescape(found.group(1), "'"), found.end()
+    try:
+        return SCAN_ONCE(text, index)
+    except (StopIteration, ValueError):
+        pass
+    if char == "[":
+        return parse_array(text, index)
+    found = IDENTIFIER.match(text, index)
+    if found and found.group(0) in LITERALS:
+        return LITERALS[found.group(0)], found.end()
+    raise JSObjectError("Expecting value", text, index)
+
+
+def parse(text):
+    value, _ = parse_at(text)
+    return value
+
+
+def sample_units(units=12):
+    entries = []
+    for i in range(units):
+        entries.append(
+            'unit%d: {name: "Unit %d", wood: %d, stone: %d, iron: %d, pop: 1, '
+            'build_time: %d, requirements_met: true, max: %d, desc: "Fast and strong"}'
+            % (i, i, 50 + i, 30 + i, 10 + i, 1000 + i, 400 + i)
+        )
+    return "{%s}" % ", ".join(entries)
+
+
+def benchmark(literal, rounds=2000):
+    # the previous recruit_data implementation: quote the keys, then json.loads
+    def regex_decode(raw):
+        return json.loads(re.sub(r"([\{\s,])(\w+)(:)", r'\1"\2"\3', raw), strict=False)
+
+    for label, func in [("regex", regex_decode), ("jsobject", parse)]:
+        try:
+            func(literal)
+        except ValueError as e:
+            print("%-8s fails: %s" % (label, e))
+            continue
+        started = time.perf_counter()
+        for _ in range(rounds):
+            func(literal)
+        elapsed = time.perf_counter() - started
+        print("%-8s %8.3fs %10.1f us/parse" % (label, elapsed, elapsed / rounds * 1e6))
+
+
+if __name__ == "__main__":
+    # python -m core.jsobject [literal.js]
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "r", encoding="utf-8") as f:
+            benchmark(f.read())
+    else:
+        benchmark(sample_units())
@@ -0,0 +1,199 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from core import codec
+from core.villagetable import VillageTable
+
+
+class MapStore:
+    """
+    All known map villages in a single SQLite database (cache/world/map.db).
+    Rows are kept in memory as well, in a VillageTable that the WorldMap of the
+    process shares: reads are id lookups and upsert only writes the villages that
+    actually changed, in one transaction.
+    """
+
+    # row layout, ids are stored as integers
+    columns = ("id", "name", "x", "y", "points", "owner", "tribe", "bonus")
+
+    instances = {}
+    logger = logging.getLogger("MapStore")
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.con = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.con:
+            self.con.execute("PRAGMA journal_mode=WAL")
+            self.con.execute(
+                """CREATE TABLE IF NOT EXISTS villages (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT,
+                    x INTEGER,
+                    y INTEGER,
+                    points INTEGER,
+                    owner INTEGER,
+                    tribe INTEGER,
+                    bonus TEXT,
+                    updated REAL
+                )"""
+            )
+            self.con.execute("CREATE INDEX IF NOT EXISTS villages_location ON villages (x, y)")
+            self.con.execute("CREATE INDEX IF NOT EXISTS villages_owner ON villages (owner)")
+        self.table = None
+        self.version = None
+        self.checked = 0
+
+    @staticmethod
+    def default_path():
+        return os.path.join(os.path.dirname(__file__), "..", "cache", "world", "map.db")
+
+    @staticmethod
+    def shared(path=None):
+        """
+        One store per database file and process
+        """
+        path = path or MapStore.default_path()
+        if path not in MapStore.instances:
+            store = MapStore(path)
+            store.import_files(
+                os.path.join(os.path.dirname(__file__), "..", "cache", "villages")
+            )
+            MapStore.instances[path] = store
+        return MapStore.instances[path]
+
+    def load(self):
+        """
+        Loads all rows into the VillageTable, again only when another process changed the database.
+        The table is updated in place, so the WorldMap of this process can share it
+        """
+        with self.lock:
+            # changes of other processes are picked up within a second
+            if self.table is not None and time.time() - self.checked < 1:
+                return self.table
+            self.checked = time.time()
+            version = self.con.execute("PRAGMA data_version").fetchone()[0]
+            if self.table is None or version != self.version:
+                if self.table is None:
+                    self.table = VillageTable()
+                cursor = self.con.execute(
+                    "SELECT %s FROM villages" % ", ".join(self.columns)
+                )
+                for row in cursor:
+                    self.table.set(row)
+                self.version = version
+            return self.table
+
+    def get(self, vid):
+        with self.lock:
+            table = self.load()
+            index = table.find(vid)
+            return table.row(index) if index is not None else None
+
+    def get_many(self, ids):
+        output = {}
+        with self.lock:
+            table = self.load()
+            for vid in ids:
+                index = table.find(vid)
+                if index is not None:
+                    output[int(vid)] = table.row(index)
+        return output
+
+    def upsert(self, rows):
+        """
+        Writes the rows that differ from the stored ones, returns the number of changed rows
+        """
+        with self.lock:
+            table = self.load()
+            changed = []
+            for row in rows:
+                index = table.find(row[0])
+                if index is None or table.row(index) != row:
+                    changed.append(row)
+            self.write(changed)
+            for row in changed:
+                table.set(row)
+            return len(changed)
+
+    def write(self, rows):
+        """
+        Writes rows in one transaction without comparing them, for rows that were
+        already applied to the shared table
+        """
+        if not rows:
+            return 0
+        now = time.time()
+        with self.lock, self.con:
+            self.con.executemany(
+                "INSERT INTO villages (id, name, x, y, points, owner, tribe, bonus, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET "
+                "name = excluded.name, x = excluded.x, y = excluded.y, points = excluded.points, "
+                "owner = excluded.owner, tribe = excluded.tribe, bonus = excluded.bonus, "
+                "updated = excluded.updated",
+                [row + (now,) for row in rows],
+            )
+        return len(rows)
+
+    def import_files(self, directory):
+        """
+        One-time migration of the cache/villages/<id>.json files of older versions
+        """
+        if not os.path.isdir(directory) or len(self.load()):
+            return 0
+        rows = []
+        for existing in os.listdir(directory):
+            if not existing.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(directory, existing), "r", encoding="utf-8") as f:
+                    rows.append(self.entry_to_row(codec.load(f)))
+            except (ValueError, KeyError, TypeError):
+                continue
+        if rows:
+            self.logger.info("Imported %d cached map villages" % len(rows))
+        return self.upsert(rows)
+
+    @staticmethod
+    def entry_to_row(entry):
+        x, y = entry["location"]
+        return (
+            int(entry["id"]),
+            entry["name"],
+            int(x),
+            int(y),
+            int(entry["points"]),
+            int(entry["owner"] or 0),
+            int(entry["tribe"] or 0),
+            codec.dumps(entry["bonus"]),
+        )
+
+    @staticmethod
+    def row_to_entry(row):
+        """
+        The village dict format used by the map, attack and web manager code
+        """
+        vid, name, x, y, points, owner, tribe, bonus = row
+        return {
+            "id": str(vid),
+            "name": name,
+            "location": [x, y],
+            "bonus": codec.loads(bonus) if bonus else None,
+            "points": points,
+            "safe": False,
+            "scout": False,
+            "tribe": str(tribe),
+            "owner": str(owner),
+            "buildings": {},
+            "resources": {},
+        }
+
+    def entries(self):
+        table = self.load()
+        return {str(table.ids[index]): self.row_to_entry(table.row(index)) for index in range(len(table))}
@@ -0,0 +1,82 @@
+import json
+import time
+from urllib.parse import urlsplit, parse_qs
+
+
+class RequestMetrics:
+    """
+    Collects per-screen and per-village request statistics (latency, bytes, count)
+    """
+
+    # upper bounds (in seconds) of the latency histogram buckets
+    buckets = [0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+
+    def __init__(self):
+        self.screens = {}
+        self.villages = {}
+        self.started = time.time()
+
+    def reset(self):
+        self.screens = {}
+        self.villages = {}
+        self.started = time.time()
+
+    @staticmethod
+    def classify(url):
+        query = parse_qs(urlsplit(url).query)
+        screen = query.get("screen", ["none"])[0]
+        if "ajaxaction" in query:
+            screen = "%s:ajaxaction=%s" % (screen, query["ajaxaction"][0])
+        elif "ajax" in query:
+            screen = "%s:ajax=%s" % (screen, query["ajax"][0])
+        elif "mode" in query:
+            screen = "%s:mode=%s" % (screen, query["mode"][0])
+        village = query.get("village", ["none"])[0]
+        return screen, village
+
+    def new_entry(self):
+        return {
+            "count": 0,
+            "errors": 0,
+            "bytes": 0,
+            "time_total": 0.0,
+            "time_max": 0.0,
+            "histogram": [0] * (len(self.buckets) + 1),
+        }
+
+    def add(self, entry, elapsed, size, error):
+        entry["count"] += 1
+        entry["bytes"] += size
+        entry["time_total"] += elapsed
+        entry["time_max"] = max(entry["time_max"], elapsed)
+        if error:
+            entry["errors"] += 1
+        index = 0
+        while index < len(self.buckets) and elapsed > self.buckets[index]:
+            index += 1
+        entry["histogram"][index] += 1
+
+    def record(self, method, url, elapsed, size=0, error=False):
+        screen, village = self.classify(url)
+        key = "%s %s" % (method, screen)
+        if key not in self.screens:
+            self.screens[key] = self.new_entry()
+        if village not in self.villages:
+            self.villages[village] = self.new_entry()
+        self.add(self.screens[key], elapsed, size, error)
+        self.add(self.villages[village], elapsed, size, error)
+
+    def summary(self):
+        return {
+            "started": int(self.started),
+            "finished": int(time.time()),
+            "buckets": self.buckets,
+            "screens": self.screens,
+            "villages": self.villages,
+        }
+
+    def dump(self, path, reset=True):
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+        if reset:
+            self.reset()
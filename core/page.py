@@ -0,0 +1,160 @@
+import re
+from collections import defaultdict
+
+from core import codec, jsobject
+from core.scanner import HTMLScanner
+
+# Every block starts with a literal marker, the full pattern is only applied at the marker positions
+PATTERNS = {
+    "csrf": (r'<meta content="', r'<meta content="(.+?)" name="csrf-token"'),
+    "h": (r"&h=", r"&h=(\w+)"),
+    "bot_protect": (r'data-bot-protect="forced"', r'data-bot-protect="forced"'),
+    "game_state": (
+        r"TribalWars\.updateGameData\(",
+        r"TribalWars\.updateGameData\((.+?)\);",
+    ),
+    "village": (r"var village = ", r"var village = (.+);"),
+    "buildings": (
+        r"BuildingMain\.buildings = ",
+        r"(?s)BuildingMain.buildings = (\{.+?\});",
+    ),
+    "quests": (r"Quests\.setQuestData\(", r"Quests.setQuestData\((\{.+?\})\);"),
+    "rewards": (
+        r"RewardSystem\.setRewards\(",
+        r"RewardSystem\.setRewards\(\s*(\[\{.+?\}\]),",
+    ),
+    "map": (r"TWMap\.sectorPrefech = ", r"(?s)TWMap.sectorPrefech = (\[(.+?)\]);"),
+    "smith": (r"BuildingSmith\.techs = ", r"(?s)BuildingSmith.techs = (\{.+?\});"),
+    "premium": (
+        r"PremiumExchange\.receiveData\(",
+        r"(?s)PremiumExchange.receiveData\((.+?)\);",
+    ),
+    "recruit": (
+        r"unit_managers\.units = ",
+        r"(?s)unit_managers.units = (\{.+?\});",
+    ),
+    "daily_bonus": (r"DailyBonus\.init\(", r"DailyBonus.init\((\s+\{.*\}),"),
+}
+
+MARKERS = re.compile(
+    "|".join("(?P<%s>%s)" % (name, marker) for name, (marker, _) in PATTERNS.items())
+)
+BLOCKS = {name: re.compile(pattern) for name, (_, pattern) in PATTERNS.items()}
+STARTS = {name: re.compile(marker) for name, (marker, _) in PATTERNS.items()}
+# blocks that look like strict json: quoted first key, empty object or an array
+JSON_START = re.compile(r'\s*(?:\{\s*["}]|\[)')
+
+
+class ParsedPage:
+    """
+    A single response body which is scanned once for all known markers.
+    Matches and decoded JSON blocks are memoized, so the results are shared
+    between all extractors that use the same page.
+    """
+
+    _last = None
+
+    def __init__(self, text):
+        self.text = text or ""
+        self._positions = None
+        self.matches = {}
+        self.decoded = {}
+
+    @property
+    def positions(self):
+        # A single pass over the document collects the position of every marker
+        if self._positions is None:
+            self._positions = defaultdict(list)
+            for found in MARKERS.finditer(self.text):
+                self._positions[found.lastgroup].append(found.start())
+        return self._positions
+
+    @staticmethod
+    def of(res):
+        """
+        Returns the ParsedPage belonging to a response (or string)
+        """
+        if res is None:
+            return ParsedPage("")
+        if isinstance(res, ParsedPage):
+            return res
+        if isinstance(res, str):
+            last = ParsedPage._last
+            if last is None or last.text is not res:
+                last = ParsedPage(res)
+                ParsedPage._last = last
+            return last
+        page = getattr(res, "page", None)
+        if page is None:
+            page = ParsedPage(res.text)
+            res.page = page
+        return page
+
+    def match(self, name):
+        if name not in self.matches:
+            result = None
+            pattern = BLOCKS[name]
+            for position in self.positions.get(name, []):
+                result = pattern.match(self.text, position)
+                if result:
+                    break
+            self.matches[name] = result
+        return self.matches[name]
+
+    def group(self, name, index=1):
+        result = self.match(name)
+        if result:
+            return result.group(index)
+        return None
+
+    def json(self, name, index=1):
+        if name not in self.decoded:
+            raw = self.group(name, index)
+            self.decoded[name] = codec.loads(raw) if raw else None
+        return self.decoded[name]
+
+    def literal(self, name):
+        """
+        Decodes the JS object literal of a block. Blocks that look like strict json
+        go to the codec, JS literals (and json cut short by the closing pattern)
+        are parsed from the marker on
+        """
+        if name not in self.decoded:
+            result = None
+            raw = self.group(name)
+            if raw:
+                parsed = False
+                if JSON_START.match(raw):
+                    try:
+                        # plain json blobs go to the (possibly accelerated) json codec
+                        result = codec.loads(raw)
+                        parsed = True
+                    except ValueError:
+                        pass
+                if not parsed:
+                    start = STARTS[name].match(self.text, self.match(name).start()).end()
+                    result, _ = jsobject.parse_at(self.text, start)
+            self.decoded[name] = result
+        return self.decoded[name]
+
+    def memoize(self, key, producer):
+        if key not in self.decoded:
+            self.decoded[key] = producer(self)
+        return self.decoded[key]
+
+    @property
+    def scan(self):
+        # HTML structures (forms, unit tables, report links) from one linear pass
+        return self.memoize("scan", lambda page: HTMLScanner.scan(page.text))
+
+    @property
+    def csrf(self):
+        return self.group("csrf")
+
+    @property
+    def h(self):
+        return self.group("h")
+
+    @property
+    def bot_protected(self):
+        return bool(self.positions.get("bot_protect"))
@@ -0,0 +1,172 @@
+import atexit
+import gzip
+import json
+import logging
+import time
+import zlib
+from collections import defaultdict, deque
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+# Query parameters which change between sessions and should not be used for matching
+VOLATILE_PARAMS = ("h", "_", "t")
+
+
+def request_key(method, url):
+    parts = urlsplit(url)
+    query = sorted(
+        (k, v)
+        for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k not in VOLATILE_PARAMS
+    )
+    return "%s %s?%s" % (method.upper(), parts.path, urlencode(query))
+
+
+class RecordedResponse:
+    """
+    Stand-in for requests.Response that is served from a fixture archive
+    """
+
+    def __init__(self, url, status_code, text, headers=None):
+        self.url = url
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+    @property
+    def content(self):
+        return self.text.encode("utf-8")
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def __bool__(self):
+        return self.ok
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class RequestRecorder:
+    """
+    Appends every request / response pair to a gzipped json-lines archive
+    """
+
+    logger = logging.getLogger("Recorder")
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self.handle = gzip.open(path, "at", encoding="utf-8")
+        # finishes the gzip stream, an unfinished one can only be read up to the last flush
+        atexit.register(self.close)
+        self.logger.info("Recording requests to %s" % path)
+
+    def record(self, method, url, data, response):
+        if not self.handle:
+            return
+        entry = {
+            "method": method,
+            "url": url,
+            "data": data,
+            "status": response.status_code,
+            "final_url": response.url,
+            "headers": {
+                "content-type": response.headers.get("content-type", "text/html")
+            },
+            "text": response.text,
+            "ts": time.time(),
+        }
+        self.handle.write(json.dumps(entry) + "\n")
+        self.handle.flush()
+        self.count += 1
+
+    def close(self):
+        if self.handle:
+            self.handle.close()
+            self.handle = None
+
+
+class ReplayCookies(dict):
+    def clear(self):
+        dict.clear(self)
+
+
+class ReplaySession:
+    """
+    Serves recorded responses instead of talking to the game server.
+    Responses are matched on method + url (volatile parameters removed) and
+    replayed in the order they were recorded, repeating the last one if a
+    request is made more often than it was recorded.
+    """
+
+    logger = logging.getLogger("Replay")
+
+    def __init__(self, path):
+        self.path = path
+        self.cookies = ReplayCookies()
+        self.recorded = defaultdict(deque)
+        self.last_served = {}
+        self.served = 0
+        self.missing = 0
+        for entry in self.read(path):
+            self.recorded[request_key(entry["method"], entry["url"])].append(entry)
+        self.logger.info(
+            "Loaded %d recorded requests from %s"
+            % (sum(len(x) for x in self.recorded.values()), path)
+        )
+
+    @staticmethod
+    def read(path):
+        """
+        Yields the recorded entries. Archives of a recorder that was killed end
+        without a gzip end-of-stream marker (and maybe half a line), everything
+        before that is still used.
+        """
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            try:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        ReplaySession.logger.warning("Skipping truncated record in %s" % path)
+            except (EOFError, zlib.error):
+                ReplaySession.logger.warning(
+                    "Recording %s was not closed properly, using the records before the end" % path
+                )
+
+    def serve(self, method, url):
+        key = request_key(method, url)
+        entries = self.recorded.get(key)
+        if entries:
+            entry = entries.popleft()
+            self.last_served[key] = entry
+        elif key in self.last_served:
+            entry = self.last_served[key]
+        else:
+            self.missing += 1
+            self.logger.warning("No recording for %s" % key)
+            return RecordedResponse(url=url, status_code=404, text="")
+        self.served += 1
+        return RecordedResponse(
+            url=entry["final_url"],
+            status_code=entry["status"],
+            text=entry["text"],
+            headers=entry.get("headers"),
+        )
+
+    def request(self, method, url, **kwargs):
+        return self.serve(method, url)
+
+    def get(self, url, headers=None, **kwargs):
+        return self.serve("GET", url)
+
+    def post(self, url, data=None, headers=None, **kwargs):
+        return self.serve("POST", url)
+
+    def reset_counters(self):
+        self.served = 0
+        self.missing = 0
@@ -1,6 +1,18 @@
+import abc
+import atexit
+import gzip
 import logging
+import os
+import queue
+import shutil
+import sqlite3
+import threading
 import warnings
 import time
+from datetime import datetime
+from urllib.parse import parse_qs
+
+from core import codec
 
 try:
     import pymysql
@@ -11,6 +23,9 @@ except ImportError:
 
 
 class RemoteReporter:
+    # structured backends receive report data as-is, the others as a string
+    structured = False
+
     def report(self, connection, village_id, action, data):
         return
 
@@ -23,25 +38,218 @@ class RemoteReporter:
     def setup(self, connection):
         return
 
+    def close(self):
+        return
+
+    @staticmethod
+    def serialize(data):
+        """
+        Report data as text, structures as JSON so they can be queried (json_extract)
+        """
+        if isinstance(data, str):
+            return data
+        try:
+            return codec.dumps(data)
+        except (TypeError, ValueError):
+            return str(data)
+
+
+class FileReporter(RemoteReporter):
+    """
+    Keeps the log file open and writes buffered lines every flush_interval seconds
+    (and at exit). The file is rotated when it grows beyond max_size bytes or,
+    with rotate_daily, when the day changes. Rotated segments can be gzipped.
+    """
+
+    logger = logging.getLogger("FileReporter")
+
+    def __init__(self, flush_interval=1.0, max_size=0, rotate_daily=False, compress=False):
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self.rotate_daily = rotate_daily
+        self.compress = compress
+        self.path = None
+        self.handle = None
+        self.day = None
+        self.buffer = []
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
 
-class FileReporter:
     def report(self, connection, village_id, action, data):
-        with open(connection, "a") as f:
-            f.write("%d - %s - %s - %s\n" % (time.time(), village_id, action, data))
+        line = "%d - %s - %s - %s\n" % (time.time(), village_id, action, data)
+        with self.lock:
+            self.buffer.append(line)
+
+    def open(self):
+        self.handle = open(self.path, "a")
+        self.day = time.strftime("%Y-%m-%d")
+
+    def flush(self):
+        with self.lock:
+            lines, self.buffer = self.buffer, []
+            if self.handle is None:
+                return
+            if lines:
+                self.handle.write("".join(lines))
+                self.handle.flush()
+            if (self.max_size and self.handle.tell() >= self.max_size) or (
+                self.rotate_daily and time.strftime("%Y-%m-%d") != self.day
+            ):
+                self.rotate()
+
+    def rotate(self):
+        self.handle.close()
+        rotated = "%s.%s" % (self.path, time.strftime("%Y%m%d-%H%M%S"))
+        counter = 1
+        while os.path.exists(rotated) or os.path.exists(rotated + ".gz"):
+            rotated = "%s.%s-%d" % (self.path, time.strftime("%Y%m%d-%H%M%S"), counter)
+            counter += 1
+        os.replace(self.path, rotated)
+        if self.compress:
+            with open(rotated, "rb") as source, gzip.open(rotated + ".gz", "wb") as target:
+                shutil.copyfileobj(source, target)
+            os.remove(rotated)
+        self.open()
+
+    def run(self):
+        while not self.stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                self.logger.warning("Unable to write log file %s: %s" % (self.path, str(e)))
+
+    def setup(self, connection):
+        self.path = connection
+        self.open()
+        self.handle.write("Starting bot at %d\n" % time.time())
+        self.handle.flush()
+        self.thread = threading.Thread(target=self.run, name="FileReporter", daemon=True)
+        self.thread.start()
+
+    def close(self):
+        if self.thread is not None:
+            self.stopped.set()
+            self.thread.join(self.flush_interval + 1)
+            self.thread = None
+        self.flush()
+        with self.lock:
+            if self.handle is not None:
+                self.handle.close()
+                self.handle = None
+
+
+class BatchReporter(RemoteReporter, abc.ABC):
+    """
+    Events (log lines and the per-village snapshots of add_data) are queued and
+    written by a background thread in batches, flushed every batch_size events
+    or flush_interval seconds. Reporting never blocks the bot, when the queue
+    is full (backend unreachable) new events are dropped.
+    Subclasses implement connect and write, and disconnect if they hold a connection.
+    """
+
+    logger = logging.getLogger("BatchReporter")
+
+    def __init__(self, batch_size=100, flush_interval=5.0, queue_size=10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.con = None
+        self.thread = None
+        self.stopped = threading.Event()
+        self.dropped = 0
+
+    @abc.abstractmethod
+    def connect(self, connection):
+        """
+        Returns an open connection, called by the writer thread before every batch
+        """
+
+    def disconnect(self):
         return
 
+    @abc.abstractmethod
+    def write(self, con, batch):
+        """
+        Writes a batch of ("log", ...) and ("data", ...) events in one transaction
+        """
+
+    @staticmethod
+    def split(batch):
+        logs = [
+            (village_id, action, data, ts)
+            for kind, (village_id, action, data, ts) in batch
+            if kind == "log"
+        ]
+        # only the latest snapshot of every village / data type has to be written
+        snapshots = {}
+        for kind, (village_id, data_type, data, ts) in batch:
+            if kind == "data":
+                snapshots[(village_id, data_type)] = (data, ts)
+        return logs, snapshots
+
+    def enqueue(self, entry):
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                self.logger.warning("Report queue is full, dropped %d events" % self.dropped)
+
+    def report(self, connection, village_id, action, data):
+        self.enqueue(("log", (village_id, action, data, datetime.now())))
+
     def add_data(self, connection, village_id, data_type, data):
-        return
+        self.enqueue(("data", (village_id, data_type, data, datetime.now())))
 
-    def get_config(self, connection, village_id, action, data):
-        return
+    def start(self, connection):
+        self.thread = threading.Thread(
+            target=self.run, args=(connection,), name=self.__class__.__name__, daemon=True
+        )
+        self.thread.start()
 
-    def setup(self, connection):
-        with open(connection, "w") as f:
-            f.write("Starting bot at %d\n" % time.time())
+    def run(self, connection):
+        while not self.stopped.is_set() or not self.queue.empty():
+            batch = []
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0 or (self.stopped.is_set() and self.queue.empty()):
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=min(remaining, 0.5)))
+                except queue.Empty:
+                    continue
+            if batch:
+                self.flush(connection, batch)
+        self.disconnect()
+
+    def flush(self, connection, batch):
+        # one retry on a fresh connection, the batch is dropped if the database stays unreachable
+        for attempt in range(2):
+            try:
+                self.write(self.connect(connection), batch)
+                return True
+            except Exception as e:
+                self.logger.warning("Unable to write %d events: %s" % (len(batch), str(e)))
+                self.disconnect()
+        return False
+
+    def close(self, timeout=10):
+        if self.thread is None:
+            return
+        self.stopped.set()
+        self.thread.join(timeout)
+        self.thread = None
+
+
+class MySQLReporter(BatchReporter):
+    """
+    Writes batches over one persistent connection using multi-row inserts
+    """
 
+    logger = logging.getLogger("MySQLReporter")
 
-class MySQLReporter(RemoteReporter):
     def connection_from_object(self, cobj):
         return pymysql.connect(
             host=cobj["host"],
@@ -51,37 +259,61 @@ class MySQLReporter(RemoteReporter):
             database=cobj["database"],
         )
 
-    def report(self, connection, village_id, action, data):
-        con = self.connection_from_object(connection)
+    def connect(self, connection):
+        if self.con is None:
+            self.con = self.connection_from_object(connection)
+        else:
+            self.con.ping(reconnect=True)
+        return self.con
+
+    def disconnect(self):
+        if self.con is not None:
+            try:
+                self.con.close()
+            except Exception:
+                pass
+            self.con = None
+
+    def write(self, con, batch):
+        logs, snapshots = self.split(batch)
         cur = con.cursor()
-        cur.execute(
-            "INSERT INTO twb_logs (village, action, data, ts) VALUES (%s, %s, %s, NOW())",
-            (village_id, action, data),
-        )
+        if logs:
+            cur.executemany(
+                "INSERT INTO twb_logs (village_id, action, data, ts) VALUES (%s, %s, %s, %s)",
+                logs,
+            )
+        if snapshots:
+            # single statement upsert on the (village_id, data_type) unique key
+            cur.executemany(
+                "INSERT INTO twb_data (village_id, data_type, data, last_update) VALUES (%s, %s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE data = VALUES(data), last_update = VALUES(last_update)",
+                [
+                    (village_id, data_type, data, ts)
+                    for (village_id, data_type), (data, ts) in snapshots.items()
+                ],
+            )
         con.commit()
         cur.close()
-        con.close()
 
-    def add_data(self, connection, village_id, data_type, data):
-        con = self.connection_from_object(connection)
+    def migrate(self, con):
+        """
+        Tables created by older versions lack the unique key the upsert depends on,
+        duplicate snapshots are removed (keeping the newest) before adding it
+        """
         cur = con.cursor()
-        cur.execute(
-            "SELECT * FROM twb_data WHERE village_id = %s AND data_type = %s",
-            (village_id, data_type),
-        )
-        if cur.rowcount > 0:
+        cur.execute("SHOW INDEX FROM twb_data WHERE Key_name = 'village_data'")
+        if cur.rowcount == 0:
+            self.logger.info("Adding unique key on twb_data (village_id, data_type)")
             cur.execute(
-                "UPDATE twb_data SET data = %s, last_update = NOW() WHERE village_id = %s AND data_type = %s",
-                (data, village_id, data_type),
+                "DELETE older FROM twb_data older JOIN twb_data newer "
+                "ON older.village_id = newer.village_id AND older.data_type = newer.data_type "
+                "AND older.id < newer.id"
             )
-        else:
             cur.execute(
-                "INSERT INTO twb_data (village_id, data_type, data, last_update) VALUES (%s, %s, %s, NOW())",
-                (village_id, data_type, data),
+                "ALTER TABLE twb_data ADD UNIQUE KEY `village_data` (`village_id`, `data_type`)"
             )
-        con.commit()
+            con.commit()
         cur.close()
-        con.close()
 
     def setup(self, connection):
         try:
@@ -92,7 +324,8 @@ class MySQLReporter(RemoteReporter):
                     `data_type`  varchar(50) NULL ,
                     `data`  text NULL ,
                     `last_update`  datetime NULL ,
-                    PRIMARY KEY (`id`)
+                    PRIMARY KEY (`id`),
+                    UNIQUE KEY `village_data` (`village_id`, `data_type`)
                     )"""
             query_logs = """CREATE TABLE IF NOT EXISTS `twb_logs` (
                             `id`  int NOT NULL AUTO_INCREMENT ,
@@ -108,14 +341,123 @@ class MySQLReporter(RemoteReporter):
                 cur.execute(query_data)
                 cur.execute(query_logs)
                 con.commit()
+            self.migrate(con)
             cur.close()
-            con.close()
+            self.con = con
+            self.start(connection)
             return True
         except Exception as e:
             print("MYSQL ERROR: %s" % str(e))
             return False
 
 
+class SQLiteReporter(BatchReporter):
+    """
+    Local WAL-mode database with indexed logs, upserted snapshots and
+    resource snapshots (TWB_PRE_RESOURCE) as numeric columns
+    """
+
+    logger = logging.getLogger("SQLiteReporter")
+    structured = True
+    schema = [
+        """CREATE TABLE IF NOT EXISTS twb_logs (
+            id INTEGER PRIMARY KEY,
+            village_id INTEGER,
+            action TEXT,
+            data TEXT,
+            ts TIMESTAMP
+        )""",
+        "CREATE INDEX IF NOT EXISTS twb_logs_village ON twb_logs (village_id, ts)",
+        "CREATE INDEX IF NOT EXISTS twb_logs_action ON twb_logs (action, ts)",
+        "CREATE INDEX IF NOT EXISTS twb_logs_ts ON twb_logs (ts)",
+        """CREATE TABLE IF NOT EXISTS twb_data (
+            village_id INTEGER,
+            data_type TEXT,
+            data TEXT,
+            last_update TIMESTAMP,
+            PRIMARY KEY (village_id, data_type)
+        )""",
+        """CREATE TABLE IF NOT EXISTS twb_resources (
+            id INTEGER PRIMARY KEY,
+            village_id INTEGER,
+            wood INTEGER,
+            stone INTEGER,
+            iron INTEGER,
+            pop INTEGER,
+            ts TIMESTAMP
+        )""",
+        "CREATE INDEX IF NOT EXISTS twb_resources_village ON twb_resources (village_id, ts)",
+    ]
+
+    def connect(self, connection):
+        # the connection is created (and only used) by the writer thread
+        if self.con is None:
+            self.con = sqlite3.connect(connection)
+            self.con.execute("PRAGMA journal_mode=WAL")
+            self.con.execute("PRAGMA synchronous=NORMAL")
+        return self.con
+
+    def disconnect(self):
+        if self.con is not None:
+            try:
+                self.con.close()
+            except Exception:
+                pass
+            self.con = None
+
+    def write(self, con, batch):
+        logs, snapshots = self.split(batch)
+        resources = [
+            (
+                village_id,
+                data.get("wood"),
+                data.get("stone"),
+                data.get("iron"),
+                data.get("pop"),
+                str(ts),
+            )
+            for village_id, action, data, ts in logs
+            if action == "TWB_PRE_RESOURCE" and isinstance(data, dict)
+        ]
+        with con:
+            con.executemany(
+                "INSERT INTO twb_logs (village_id, action, data, ts) VALUES (?, ?, ?, ?)",
+                [
+                    (village_id, action, self.serialize(data), str(ts))
+                    for village_id, action, data, ts in logs
+                ],
+            )
+            con.executemany(
+                "INSERT INTO twb_resources (village_id, wood, stone, iron, pop, ts) VALUES (?, ?, ?, ?, ?, ?)",
+                resources,
+            )
+            con.executemany(
+                "INSERT INTO twb_data (village_id, data_type, data, last_update) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (village_id, data_type) DO UPDATE SET data = excluded.data, last_update = excluded.last_update",
+                [
+                    (village_id, data_type, self.serialize(data), str(ts))
+                    for (village_id, data_type), (data, ts) in snapshots.items()
+                ],
+            )
+
+    def setup(self, connection):
+        try:
+            directory = os.path.dirname(connection)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            con = sqlite3.connect(connection)
+            con.execute("PRAGMA journal_mode=WAL")
+            with con:
+                for query in self.schema:
+                    con.execute(query)
+            con.close()
+            self.start(connection)
+            return True
+        except Exception as e:
+            self.logger.error("SQLite error: %s" % str(e))
+            return False
+
+
 class ReporterObject:
     enabled = False
     object = None
@@ -136,7 +478,7 @@ class ReporterObject:
                 self.enabled = False
                 return
 
-            parameters = connection_string.split("://")[1]
+            parameters, options = self.options(connection_string)
             creds, host_and_db = parameters.split("@")
             username, password = creds.split(":")
             host, database = host_and_db.split("/")
@@ -151,28 +493,71 @@ class ReporterObject:
                 "password": password,
                 "database": database,
             }
-            self.object = MySQLReporter()
+            self.object = MySQLReporter(
+                batch_size=int(options.get("batch_size", 100)),
+                flush_interval=float(options.get("flush_interval", 5)),
+            )
             if self.object.setup(self.connection):
                 self.logger.info("MySQL set-up complete")
+                atexit.register(self.close)
             else:
                 self.logger.info("Unable to set-up MySQL logging, disabling!")
                 self.enabled = False
         elif connection_string.startswith("file://"):
-            outfile = connection_string.split("://")[1]
+            outfile, options = self.options(connection_string)
             outfile = outfile.replace("{ts}", str(int(time.time())))
             self.connection = outfile
-            self.object = FileReporter()
+            self.object = FileReporter(
+                flush_interval=float(options.get("flush_interval", 1)),
+                max_size=int(options.get("max_size", 0)),
+                rotate_daily=options.get("rotate") == "daily",
+                compress=options.get("compress") in ("1", "true", "gzip"),
+            )
             self.object.setup(self.connection)
+            atexit.register(self.close)
+        elif connection_string.startswith("sqlite://"):
+            database, options = self.options(connection_string)
+            self.connection = database
+            self.object = SQLiteReporter(
+                batch_size=int(options.get("batch_size", 100)),
+                flush_interval=float(options.get("flush_interval", 5)),
+            )
+            if self.object.setup(self.connection):
+                self.logger.info("SQLite set-up complete")
+                atexit.register(self.close)
+            else:
+                self.logger.info("Unable to set-up SQLite logging, disabling!")
+                self.enabled = False
         else:
             self.object = RemoteReporter()
 
+    @staticmethod
+    def options(connection_string):
+        """
+        Splits scheme://location?option=value into the location and an option dict
+        """
+        parameters = connection_string.split("://", 1)[1]
+        options = {}
+        if "?" in parameters:
+            parameters, query = parameters.split("?", 1)
+            options = {k: v[-1] for k, v in parse_qs(query).items()}
+        return parameters, options
+
+    def close(self):
+        if self.object:
+            self.object.close()
+
     def report(self, village_id, action, data):
         if self.enabled:
+            if not self.object.structured:
+                data = self.object.serialize(data)
             return self.object.report(self.connection, village_id, action, data)
         return
 
     def add_data(self, village_id, data_type, data):
         if self.enabled:
+            if not self.object.structured:
+                data = self.object.serialize(data)
             return self.object.add_data(self.connection, village_id, data_type, data)
         return
 
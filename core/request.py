@@ -1,18 +1,171 @@
 import requests
 
 try:
-    from urllib.parse import urljoin, urlencode
+    from urllib.parse import urljoin, urlencode, urlsplit, parse_qs
 except ImportError:
-    from urlparse import urljoin, urlencode
+    from urlparse import urljoin, urlencode, urlsplit, parse_qs
 import logging
-import re
 import time
 import random
 import json
 import os
+from collections import defaultdict
+from contextlib import contextmanager
+from core.background import BackgroundWorker
+from core.metrics import RequestMetrics
+from core.page import ParsedPage
+from core.recorder import ReplaySession, RequestRecorder, request_key
 from core.reporter import ReporterObject
 
 
+class TransportPolicy:
+    """
+    Timeouts, retries and the time budget of a single village cycle
+    """
+
+    def __init__(
+        self,
+        connect_timeout=10,
+        read_timeout=30,
+        cycle_budget=900,
+        max_retries=2,
+        backoff=2.0,
+        background_budget=30,
+    ):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        # Max seconds a village cycle may spend on requests, 0 to disable
+        self.cycle_budget = cycle_budget
+        self.max_retries = max_retries
+        self.backoff = backoff
+        # Max reports / map / market requests per village cycle
+        self.background_budget = background_budget
+
+    @staticmethod
+    def from_config(bot_config):
+        return TransportPolicy(
+            connect_timeout=bot_config.get("connect_timeout", 10),
+            read_timeout=bot_config.get("read_timeout", 30),
+            cycle_budget=bot_config.get("cycle_time_budget", 900),
+            max_retries=bot_config.get("request_retries", 2),
+            background_budget=bot_config.get("background_request_budget", 30),
+        )
+
+    @property
+    def timeout(self):
+        return self.connect_timeout, self.read_timeout
+
+    def backoff_delay(self, attempt):
+        # Full jitter so retries do not line up with the regular request pattern
+        return random.uniform(self.backoff / 2, self.backoff * (2**attempt))
+
+
+class RequestScheduler:
+    """
+    Every request belongs to a priority class with its own pacing and request budget.
+    Background work (reports, map, market) is limited per cycle so it never delays
+    the more important requests of the cycle.
+    """
+
+    TIMED = 0
+    DEFENCE = 1
+    BUILD = 2
+    BACKGROUND = 3
+
+    def __init__(self, background_budget=30):
+        # think-time range (multiplied by the delay factor) per priority class
+        self.pacing = {
+            self.TIMED: (0, 0),
+            self.DEFENCE: (1, 3),
+            self.BUILD: (3, 7),
+            self.BACKGROUND: (3, 7),
+        }
+        # max requests per village cycle, None for unlimited
+        self.budgets = {
+            self.TIMED: None,
+            self.DEFENCE: None,
+            self.BUILD: None,
+            self.BACKGROUND: background_budget,
+        }
+        self.used = defaultdict(int)
+        # classes that ran out of budget this cycle, only the first skip is logged
+        self.exhausted = set()
+        self.stack = [self.BUILD]
+
+    @property
+    def current(self):
+        return self.stack[-1]
+
+    @property
+    def urgent(self):
+        return self.current <= self.DEFENCE
+
+    @contextmanager
+    def use(self, priority):
+        self.stack.append(priority)
+        try:
+            yield self
+        finally:
+            self.stack.pop()
+
+    def reset(self):
+        self.used.clear()
+        self.exhausted.clear()
+
+    def delay(self, factor):
+        low, high = self.pacing[self.current]
+        if not high:
+            return 0
+        return random.randint(int(low * factor), int(high * factor))
+
+    def allow(self):
+        budget = self.budgets[self.current]
+        if budget is not None and self.used[self.current] >= budget:
+            return False
+        self.used[self.current] += 1
+        return True
+
+
+class FailedResponse:
+    """
+    Returned instead of a response when a request could not be completed.
+    It evaluates to False just like an unsuccessful requests.Response
+    """
+
+    TIMEOUT = "timeout"
+    CONNECTION = "connection"
+    SERVER = "server"
+    BUDGET = "budget"
+    ERROR = "error"
+
+    status_code = 0
+    text = ""
+    content = b""
+    ok = False
+
+    def __init__(self, url, reason, error=None):
+        self.url = url
+        self.reason = reason
+        self.error = error
+        self.headers = {}
+
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return "<FailedResponse %s: %s>" % (self.reason, self.url)
+
+    @staticmethod
+    def is_budget(response):
+        """
+        True if the request was skipped because the cycle / class budget is used up
+        """
+        return isinstance(response, FailedResponse) and response.reason == FailedResponse.BUDGET
+
+    def json(self):
+        raise ValueError("Request to %s failed (%s)" % (self.url, self.reason))
+
+
 class WebWrapper:
     web = None
     headers = {
@@ -24,10 +177,16 @@ class WebWrapper:
     server = None
     last_response = None
     last_h = None
-    priority_mode = False
     auth_endpoint = None
     reporter = None
     delay = 1.0
+    recorder = None
+    replaying = False
+    # GET responses of the current village cycle, None when no cycle is active
+    cycle_cache = None
+    cache_hits = 0
+    deadline = None
+    background = None
 
     def __init__(
         self,
@@ -36,8 +195,25 @@ class WebWrapper:
         endpoint=None,
         reporter_enabled=False,
         reporter_constr=None,
+        record_to=None,
+        replay_from=None,
+        policy=None,
+        background=False,
     ):
-        self.web = requests.session()
+        self.policy = policy if policy else TransportPolicy()
+        self.scheduler = RequestScheduler(
+            background_budget=self.policy.background_budget
+        )
+        if background:
+            self.background = BackgroundWorker()
+        if replay_from:
+            self.web = ReplaySession(replay_from)
+            self.replaying = True
+        else:
+            self.web = requests.session()
+        if record_to:
+            self.recorder = RequestRecorder(record_to)
+        self.metrics = RequestMetrics()
         self.auth_endpoint = url
         self.server = server
         self.endpoint = endpoint
@@ -46,67 +222,228 @@ class WebWrapper:
         )
 
     def post_process(self, response):
-        xsrf = re.search('<meta content="(.+?)" name="csrf-token"', response.text)
+        page = ParsedPage.of(response)
+        xsrf = page.csrf
         if xsrf:
-            self.headers["x-csrf-token"] = xsrf.group(1)
+            self.headers["x-csrf-token"] = xsrf
             self.logger.debug("Set CSRF token")
         elif "x-csrf-token" in self.headers:
             del self.headers["x-csrf-token"]
         self.headers["Referer"] = response.url
         self.last_response = response
-        get_h = re.search(r"&h=(\w+)", response.text)
+        get_h = page.h
         if get_h:
-            self.last_h = get_h.group(1)
+            self.last_h = get_h
+
+    def start_cycle(self):
+        self.cycle_cache = {}
+        self.cache_hits = 0
+        self.scheduler.reset()
+        self.deadline = None
+        if self.policy.cycle_budget:
+            self.deadline = time.time() + self.policy.cycle_budget
+
+    def end_cycle(self):
+        if self.cycle_cache is not None and self.cache_hits:
+            self.logger.debug(
+                "Cycle cache saved %d duplicate requests" % self.cache_hits
+            )
+        self.cycle_cache = None
+        self.deadline = None
+
+    def over_budget(self, url):
+        # Timed and defensive commands are never skipped
+        if self.scheduler.urgent:
+            return False
+        if self.deadline and time.time() > self.deadline:
+            self.budget_exhausted("cycle", "Cycle time budget exceeded", url)
+            return True
+        if not self.scheduler.allow():
+            self.budget_exhausted(
+                self.scheduler.current,
+                "Request budget of priority %d exhausted" % self.scheduler.current,
+                url,
+            )
+            return True
+        return False
+
+    def budget_exhausted(self, key, message, url):
+        if key in self.scheduler.exhausted:
+            self.logger.debug("%s, skipping %s" % (message, url))
+            return
+        self.scheduler.exhausted.add(key)
+        self.logger.warning(
+            "%s, skipping %s and the remaining requests of this cycle" % (message, url)
+        )
+
+    def send(self, method, url, **kwargs):
+        """
+        Performs the request, GETs of plain screens are retried on network / server errors
+        """
+        attempts = 1
+        if method == "GET" and self.is_cacheable(url):
+            attempts += self.policy.max_retries
+        failure = None
+        for attempt in range(attempts):
+            if attempt:
+                time.sleep(self.policy.backoff_delay(attempt))
+            started = time.perf_counter()
+            try:
+                res = self.web.request(
+                    method, url=url, timeout=self.policy.timeout, **kwargs
+                )
+            except Exception as e:
+                reason = FailedResponse.ERROR
+                if isinstance(e, requests.Timeout):
+                    reason = FailedResponse.TIMEOUT
+                elif isinstance(e, requests.ConnectionError):
+                    reason = FailedResponse.CONNECTION
+                failure = FailedResponse(url, reason, e)
+                self.metrics.record(
+                    method, url, time.perf_counter() - started, error=True
+                )
+            else:
+                self.metrics.record(
+                    method, url, time.perf_counter() - started, len(res.content)
+                )
+                if res.status_code < 500:
+                    return res
+                failure = FailedResponse(url, FailedResponse.SERVER, res.status_code)
+            self.logger.warning(
+                "%s %s failed (%s): %s (attempt %d/%d)"
+                % (method, url, failure.reason, failure.error, attempt + 1, attempts)
+            )
+        return failure
+
+    @staticmethod
+    def url_village(url):
+        query = parse_qs(urlsplit(url).query)
+        return query.get("village", [None])[0]
+
+    @staticmethod
+    def is_cacheable(url):
+        query = parse_qs(urlsplit(url).query)
+        if "screen" not in query:
+            return False
+        for modifier in ["action", "ajaxaction", "ajax", "try"]:
+            if modifier in query:
+                return False
+        return True
+
+    def invalidate(self, url):
+        if self.cycle_cache is None:
+            return
+        village = self.url_village(url)
+        for key, (cached_village, _) in list(self.cycle_cache.items()):
+            if cached_village is None or village is None or cached_village == village:
+                self.cycle_cache.pop(key)
+
+    def cache_response(self, url, res):
+        if self.cycle_cache is None:
+            return
+        if not self.is_cacheable(url):
+            # Anything that is not a plain screen might change the game state
+            self.invalidate(url)
+            if not res or not self.is_cacheable(res.url):
+                return
+            url = res.url
+        if res:
+            self.cycle_cache[request_key("GET", url)] = (self.url_village(url), res)
+
+    def close(self):
+        """
+        Finishes background jobs and the request recording
+        """
+        if self.background:
+            self.background.stop()
+            self.background = None
+        if self.recorder:
+            self.recorder.close()
+
+    def defer(self, func, *args, **kwargs):
+        """
+        Runs local work in the background so it overlaps with the request delays
+        """
+        if self.background:
+            return self.background.submit(func, *args, **kwargs)
+        return func(*args, **kwargs)
+
+    def drain(self):
+        if self.background:
+            self.background.drain()
+
+    def think(self):
+        # Replayed sessions are used for offline benchmarking, no need to act human
+        if self.replaying:
+            return
+        delay = self.scheduler.delay(self.delay)
+        if delay:
+            time.sleep(delay)
 
     def get_url(self, url, headers=None):
         self.headers["Origin"] = (
             self.endpoint if self.endpoint else self.auth_endpoint
         ).rstrip("/")
-        if not self.priority_mode:
-            time.sleep(random.randint(int(3 * self.delay), int(7 * self.delay)))
         url = urljoin(self.endpoint if self.endpoint else self.auth_endpoint, url)
+        if not headers and self.cycle_cache is not None:
+            _, cached = self.cycle_cache.get(request_key("GET", url), (None, None))
+            if cached is not None:
+                self.cache_hits += 1
+                self.logger.debug("GET %s [cached]" % url)
+                self.post_process(cached)
+                return cached
+        if self.over_budget(url):
+            return FailedResponse(url, FailedResponse.BUDGET)
+        self.think()
         if not headers:
             headers = self.headers
-        try:
-            res = self.web.get(url=url, headers=headers)
-            self.logger.debug("GET %s [%d]" % (url, res.status_code))
-            self.post_process(res)
-            if 'data-bot-protect="forced"' in res.text:
-                self.logger.warning("Bot protection hit! cannot continue")
-                self.reporter.report(
-                    0,
-                    "TWB_RECAPTCHA",
-                    "Stopping bot, press any key once captcha has been solved",
-                )
-                input("Press any key...")
-                return self.get_url(url, headers)
+        res = self.send("GET", url, headers=headers)
+        if isinstance(res, FailedResponse):
+            self.cache_response(url, res)
             return res
-        except Exception as e:
-            self.logger.warning("GET %s: %s" % (url, str(e)))
-            return None
+        self.logger.debug("GET %s [%d]" % (url, res.status_code))
+        if self.recorder:
+            self.recorder.record("GET", url, None, res)
+        self.post_process(res)
+        if ParsedPage.of(res).bot_protected:
+            self.logger.warning("Bot protection hit! cannot continue")
+            self.reporter.report(
+                0,
+                "TWB_RECAPTCHA",
+                "Stopping bot, press any key once captcha has been solved",
+            )
+            input("Press any key...")
+            return self.get_url(url, headers)
+        self.cache_response(url, res)
+        return res
 
     def post_url(self, url, data, headers=None):
-        if not self.priority_mode:
-            time.sleep(random.randint(int(3 * self.delay), int(7 * self.delay)))
         self.headers["Origin"] = (
             self.endpoint if self.endpoint else self.auth_endpoint
         ).rstrip("/")
         url = urljoin(self.endpoint if self.endpoint else self.auth_endpoint, url)
         enc = urlencode(data)
+        self.invalidate(url)
+        if self.over_budget(url):
+            return FailedResponse(url, FailedResponse.BUDGET)
+        self.think()
         if not headers:
             headers = self.headers
-        try:
-            res = self.web.post(url=url, data=data, headers=headers)
-            self.logger.debug("POST %s %s [%d]" % (url, enc, res.status_code))
-            self.post_process(res)
+        res = self.send("POST", url, data=data, headers=headers)
+        if isinstance(res, FailedResponse):
             return res
-        except Exception as e:
-            self.logger.warning("POST %s %s: %s" % (url, enc, str(e)))
-            return None
+        self.logger.debug("POST %s %s [%d]" % (url, enc, res.status_code))
+        if self.recorder:
+            self.recorder.record("POST", url, data, res)
+        self.post_process(res)
+        return res
 
     def start(
         self,
     ):
+        if self.replaying:
+            self.logger.info("Replaying recorded session %s" % self.web.path)
+            return True
         session_file = os.path.join(
             os.path.dirname(__file__), "..", "cache", "session.json"
         )
@@ -115,7 +452,7 @@ class WebWrapper:
                 session_data = json.load(f)
                 self.web.cookies.update(session_data["cookies"])
                 get_test = self.get_url("game.php?screen=overview")
-                if "game.php" in get_test.url:
+                if get_test and "game.php" in get_test.url:
                     return True
                 else:
                     self.logger.warning("Current session cache not valid")
@@ -0,0 +1,216 @@
+import re
+import sys
+import time
+
+# Every tag is matched exactly once. Quoted attribute values are matched as a whole,
+# a ">" inside them (data-title with HTML) does not end the tag
+TAG = re.compile(r"""<(/?)([a-zA-Z][a-zA-Z0-9]*)((?:[^'">]+|"[^"]*"|'[^']*')*)>?""")
+ATTRIBUTE = re.compile(
+    r"""([^\s=/]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"']+)))?"""
+)
+UNIT_CLASS = re.compile(r"unit-item unit-item-([a-z]+)")
+TRAILING_NUMBER = re.compile(r"(\d+)$")
+TOOLTIP = re.compile(r"\s*tooltip\s*")
+# Raw text elements, their content is skipped: "i<n" in a script is not a tag
+RAW_TEXT = {
+    "script": re.compile(r"</script\s*>", re.IGNORECASE),
+    "style": re.compile(r"</style\s*>", re.IGNORECASE),
+}
+
+# Only tags containing one of these are interesting for span / a / other tags
+MARKERS = ("village_anchor", "relative_time", "quickedit-vn", "report-link", "btn-cancel")
+
+
+def parse_attributes(raw):
+    attributes = {}
+    for found in ATTRIBUTE.finditer(raw):
+        key = found.group(1).lower()
+        value = found.group(2)
+        if value is None:
+            value = found.group(3)
+        if value is None:
+            value = found.group(4)
+        attributes[key] = value if value is not None else ""
+    return attributes
+
+
+class ScanResult:
+    """
+    All HTML structures the extractors need, collected in a single pass
+    """
+
+    def __init__(self):
+        # (name, value) of every <input> with a name
+        self.inputs = []
+        # (unit, amount) of unit cells outside rows with a village anchor
+        self.units_total = []
+        # (unit, amount) of the "from this village" row of table#units_home
+        self.units_home = []
+        self.report_ids = []
+        self.village_ids = []
+        self.durations = []
+        self.build_queue_cancels = 0
+        self.has_build_queue = False
+
+
+class HTMLScanner:
+    """
+    Linear time tokenizer: walks the document once and emits a ScanResult
+    """
+
+    @staticmethod
+    def scan(text):
+        result = ScanResult()
+        tables = []
+        # row index within table#units_home, -1 when not inside the table
+        home_row = -1
+        skip_row = False
+        cell_unit = None
+        cell_home = False
+        cell_text = []
+        last_end = 0
+        position = 0
+
+        while True:
+            tag = TAG.search(text, position)
+            if not tag:
+                break
+            position = tag.end()
+            if cell_unit is not None:
+                cell_text.append(text[last_end : tag.start()])
+            last_end = tag.end()
+            closing, name, raw = tag.group(1), tag.group(2).lower(), tag.group(3)
+
+            if not closing and name in RAW_TEXT:
+                end = RAW_TEXT[name].search(text, position)
+                position = last_end = end.start() if end else len(text)
+                continue
+
+            if closing:
+                if name == "td" and cell_unit is not None:
+                    amount = TRAILING_NUMBER.search("".join(cell_text).strip())
+                    if amount:
+                        if not skip_row:
+                            result.units_total.append((cell_unit, amount.group(1)))
+                        if cell_home and home_row == 1:
+                            result.units_home.append(
+                                (TOOLTIP.sub("", cell_home), amount.group(1))
+                            )
+                    cell_unit = None
+                    cell_text = []
+                elif name == "tr":
+                    skip_row = False
+                    if home_row >= 0:
+                        home_row += 1
+                elif name == "table" and tables:
+                    closed = tables.pop()
+                    if closed == "units_home":
+                        home_row = -1
+                continue
+
+            if name == "input":
+                attributes = parse_attributes(raw)
+                if "name" in attributes:
+                    result.inputs.append(
+                        (attributes["name"], attributes.get("value", ""))
+                    )
+            elif name == "td":
+                if "unit-item" in raw:
+                    attributes = parse_attributes(raw)
+                    unit = UNIT_CLASS.search(attributes.get("class", ""))
+                    if unit:
+                        cell_unit = unit.group(1)
+                        cell_home = False
+                        if home_row == 1:
+                            cell_home = attributes["class"].split("unit-item-", 1)[1]
+            elif name == "table":
+                table_id = None
+                if "id=" in raw:
+                    table_id = parse_attributes(raw).get("id")
+                tables.append(table_id)
+                if table_id == "units_home":
+                    home_row = 0
+                elif table_id == "build_queue":
+                    result.has_build_queue = True
+            elif any(marker in raw for marker in MARKERS):
+                attributes = parse_attributes(raw)
+                css = attributes.get("class", "")
+                if name == "span" and css.startswith("village_anchor"):
+                    skip_row = True
+                elif name == "span" and css == "relative_time":
+                    if attributes.get("data-duration", "").isdigit():
+                        result.durations.append(int(attributes["data-duration"]))
+                elif name == "span" and css == "quickedit-vn":
+                    if attributes.get("data-id", "").isdigit():
+                        result.village_ids.append(attributes["data-id"])
+                elif css == "report-link":
+                    if attributes.get("data-id", "").isdigit():
+                        result.report_ids.append(attributes["data-id"])
+                elif name == "a" and css == "btn btn-cancel":
+                    if "build_queue" in tables:
+                        result.build_queue_cancels += 1
+        return result
+
+
+class RegexReference:
+    """
+    The previous regex based extractors, used as the benchmark baseline
+    """
+
+    @staticmethod
+    def run(res):
+        stripped = re.sub(r'(?s)<span class="village_anchor.+?</tr>', "", res)
+        re.findall(r"(?s)class=\Wunit-item unit-item-([a-z]+)\W.+?(\d+)</td>", stripped)
+        re.findall(r'(?s)<input.+?name="(.+?)".+?value="(.*?)"', res)
+        re.search(r'<table id="units_home".*?</tr>(.*?)</tr>', res, re.DOTALL)
+        re.findall(r'(?s)class="report-link" data-id="(\d+)"', res)
+        re.search(r'<span class="relative_time" data-duration="(\d+)"', res)
+        re.findall(r'<span class="quickedit-vn" data-id="(\d+)"', res)
+        re.search('(?s)<table id="build_queue"(.+?)</table>', res)
+
+
+def sample_page(villages=200):
+    rows = []
+    for v in range(villages):
+        cells = "".join(
+            '<td class="unit-item unit-item-%s">%d</td>' % (unit, v)
+            for unit in ["spear", "sword", "axe", "spy", "light", "heavy", "ram"]
+        )
+        rows.append(
+            '<tr><td><span class="village_anchor contexted" data-id="%d">'
+            '<a href="#">Village %d</a></span></td>%s</tr>' % (v, v, cells)
+        )
+    inputs = "".join(
+        '<input type="text" name="%s" value="%d" class="unitsInput" />' % (unit, i)
+        for i, unit in enumerate(["spear", "sword", "axe", "spy", "light", "heavy"])
+    )
+    return (
+        '<html><body><form id="command-data-form">%s<input type="hidden" name="x" value="" />'
+        '<input type="hidden" name="cb" /></form>'
+        '<table id="units_home"><tr><th>Units</th></tr>%s</table>'
+        '<span class="relative_time" data-duration="1234">0:20:34</span>'
+        "</body></html>" % (inputs, "".join(rows))
+    )
+
+
+def benchmark(pages, rounds=5):
+    size = sum(len(page) for page in pages) * rounds / (1024 * 1024)
+    for label, func in [("regex", RegexReference.run), ("scanner", HTMLScanner.scan)]:
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for page in pages:
+                func(page)
+        elapsed = time.perf_counter() - started
+        print("%-8s %8.3fs %8.2f MB/s" % (label, elapsed, size / elapsed))
+
+
+if __name__ == "__main__":
+    # python -m core.scanner [page.html ...]
+    if len(sys.argv) > 1:
+        loaded = []
+        for path in sys.argv[1:]:
+            with open(path, "r", encoding="utf-8") as f:
+                loaded.append(f.read())
+    else:
+        loaded = [sample_page()]
+    benchmark(loaded)
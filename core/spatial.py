@@ -0,0 +1,168 @@
+import math
+import random
+import time
+from array import array
+
+from core.villagetable import VillageTable
+
+
+class SpatialIndex:
+    """
+    Uniform grid over the map coordinates of a VillageTable.
+    A radius query only visits the cells overlapping the search square,
+    so the cost depends on the number of nearby villages and not on the map size.
+    Cells hold table rows, coordinates / points / owner are read from the table columns.
+    """
+
+    def __init__(self, table=None, cell_size=10):
+        self.table = table if table is not None else VillageTable()
+        self.cell_size = cell_size
+        # cell key -> rows, row -> cell key
+        self.cells = {}
+        self.cell_of = array("q")
+
+    def __len__(self):
+        return len(self.cell_of)
+
+    def key(self, cx, cy):
+        return cx * 65536 + cy
+
+    def update(self, index):
+        """
+        (Re)indexes a table row after it was added or moved
+        """
+        size = self.cell_size
+        key = self.key(self.table.x[index] // size, self.table.y[index] // size)
+        if index < len(self.cell_of):
+            old = self.cell_of[index]
+            if old == key:
+                return False
+            self.cells[old].remove(index)
+        else:
+            while len(self.cell_of) < index:
+                self.cell_of.append(0)
+            self.cell_of.append(key)
+        self.cell_of[index] = key
+        self.cells.setdefault(key, array("i")).append(index)
+        return True
+
+    def sync(self):
+        """
+        Indexes the rows that were appended to the table by someone else (the map store)
+        since the last call. Villages never move, rows that are already indexed stay valid
+        """
+        for index in range(len(self.cell_of), len(self.table)):
+            self.update(index)
+
+    def find(self, x, y):
+        """
+        Table row of the village at (x, y), None if no village is known there
+        """
+        self.sync()
+        size = self.cell_size
+        table = self.table
+        for index in self.cells.get(self.key(int(x) // size, int(y) // size), ()):
+            if table.x[index] == x and table.y[index] == y:
+                return index
+        return None
+
+    def add(self, vid, x, y, points=0, owner=0):
+        if self.table.set((int(vid), "", int(x), int(y), int(points), int(owner), 0, None)):
+            return self.update(self.table.rows[int(vid)])
+        return False
+
+    def query(self, x, y, radius, min_points=None, max_points=None, include=None):
+        """
+        Barbarian villages (and the ones in include) within radius of (x, y),
+        points strictly between min_points and max_points.
+        Returns (distance, vid) tuples ordered by distance
+        """
+        self.sync()
+        include = {int(vid) for vid in include} if include else ()
+        table = self.table
+        ids, xs, ys, points, owner = table.ids, table.x, table.y, table.points, table.owner
+        low = min_points if min_points is not None else -1
+        high = max_points if max_points is not None else 2 ** 31
+        size = self.cell_size
+        r2 = radius * radius
+        found = []
+        for cx in range(int(math.floor((x - radius) / size)), int(math.floor((x + radius) / size)) + 1):
+            for cy in range(int(math.floor((y - radius) / size)), int(math.floor((y + radius) / size)) + 1):
+                bucket = self.cells.get(self.key(cx, cy))
+                if not bucket:
+                    continue
+                for index in bucket:
+                    if owner[index] and ids[index] not in include:
+                        continue
+                    if not low < points[index] < high:
+                        continue
+                    d2 = (xs[index] - x) ** 2 + (ys[index] - y) ** 2
+                    if d2 <= r2:
+                        found.append((d2, ids[index]))
+        found.sort()
+        return [(math.sqrt(d2), str(vid)) for d2, vid in found]
+
+
+def linear_query(villages, x, y, radius, min_points=None, max_points=None, include=None):
+    # the previous get_targets approach: distance to every village, then sort
+    include = include or ()
+    output = []
+    for vid, (vx, vy, points, owner) in villages.items():
+        if owner != "0" and vid not in include:
+            continue
+        if min_points is not None and points <= min_points:
+            continue
+        if max_points is not None and points >= max_points:
+            continue
+        distance = math.sqrt((vx - x) ** 2 + (vy - y) ** 2)
+        if distance <= radius:
+            output.append((distance, vid))
+    return sorted(output)
+
+
+def benchmark(sizes=(10000, 100000), radius=20, queries=200):
+    for size in sizes:
+        rng = random.Random(size)
+        villages = {}
+        # roughly the density of a grown world around the center
+        span = int(math.sqrt(size) * 2)
+        for vid in range(size):
+            villages[str(vid)] = (
+                500 + rng.randint(-span, span),
+                500 + rng.randint(-span, span),
+                rng.randint(26, 12000),
+                "0" if rng.random() < 0.3 else str(rng.randint(1, 5000)),
+            )
+        table = VillageTable()
+        for vid, (x, y, points, owner) in villages.items():
+            table.set((int(vid), "", x, y, points, int(owner), 0, None))
+        started = time.perf_counter()
+        index = SpatialIndex(table)
+        for row in range(len(table)):
+            index.update(row)
+        built = time.perf_counter() - started
+        origins = [(500 + rng.randint(-span, span), 500 + rng.randint(-span, span)) for _ in range(queries)]
+
+        for label, func in [
+            ("linear", lambda x, y: linear_query(villages, x, y, radius, 0, 1000)),
+            ("grid", lambda x, y: index.query(x, y, radius, 0, 1000)),
+        ]:
+            started = time.perf_counter()
+            for x, y in origins:
+                func(x, y)
+            elapsed = time.perf_counter() - started
+            print(
+                "%7d villages %-6s %10.1f us/query"
+                % (size, label, elapsed / queries * 1e6)
+            )
+        assert all(
+            # same result, ties may be ordered differently (string vs integer ids)
+            linear_query(villages, x, y, radius, 0, 1000) == sorted(index.query(x, y, radius, 0, 1000))
+            for x, y in origins[:10]
+        )
+        print("%7d villages index build %.3fs" % (size, built))
+
+
+if __name__ == "__main__":
+    # python -m core.spatial
+    benchmark()
@@ -0,0 +1,13 @@
+import os
+
+from core import codec
+
+
+def write_json(path, entry):
+    """
+    Writes the entry to a temporary file first so readers never see a partial file
+    """
+    tmp_path = "%s.tmp" % path
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        codec.dump(entry, f)
+    os.replace(tmp_path, path)
@@ -0,0 +1,130 @@
+import math
+import random
+import time
+
+from core.spatial import SpatialIndex
+from core.villagetable import VillageTable
+
+try:
+    import numpy
+
+    has_numpy = True
+except ImportError:
+    has_numpy = False
+
+
+def candidate_mask(table, min_points=None, max_points=None, include=None):
+    """
+    Villages that can be farmed at all: barbarian (or included) and within the points range
+    """
+    ids = numpy.frombuffer(table.ids, dtype=numpy.int64)
+    owner = numpy.frombuffer(table.owner, dtype=numpy.int64)
+    points = numpy.frombuffer(table.points, dtype=numpy.int32)
+    mask = owner == 0
+    if include:
+        mask |= numpy.isin(ids, numpy.fromiter((int(vid) for vid in include), dtype=numpy.int64))
+    if min_points is not None:
+        mask &= points > min_points
+    if max_points is not None:
+        mask &= points < max_points
+    return mask
+
+
+def targets_numpy(table, sources, radius, min_points=None, max_points=None, include=None, block=4000000):
+    """
+    One distance matrix (sources x candidates), the filters are applied as masks.
+    Sources are processed in blocks so the matrix stays below block cells
+    """
+    keys = list(sources)
+    output = {key: [] for key in keys}
+    if not keys or not len(table):
+        return output
+    origins = numpy.array([sources[key] for key in keys], dtype=numpy.int64)
+    x = numpy.frombuffer(table.x, dtype=numpy.int32).astype(numpy.int64)
+    y = numpy.frombuffer(table.y, dtype=numpy.int32).astype(numpy.int64)
+    mask = candidate_mask(table, min_points, max_points, include)
+    # nothing outside the bounding box of all sources can be in range
+    mask &= (x >= origins[:, 0].min() - radius) & (x <= origins[:, 0].max() + radius)
+    mask &= (y >= origins[:, 1].min() - radius) & (y <= origins[:, 1].max() + radius)
+    rows = numpy.nonzero(mask)[0]
+    if not len(rows):
+        return output
+    ids = numpy.frombuffer(table.ids, dtype=numpy.int64)[rows]
+    cx, cy = x[rows], y[rows]
+    r2 = radius * radius
+    step = max(1, block // len(rows))
+    for start in range(0, len(keys), step):
+        chunk = origins[start : start + step]
+        d2 = (chunk[:, 0:1] - cx) ** 2 + (chunk[:, 1:2] - cy) ** 2
+        within = d2 <= r2
+        for offset in range(len(chunk)):
+            hits = numpy.nonzero(within[offset])[0]
+            if not len(hits):
+                continue
+            distances = d2[offset, hits]
+            order = numpy.lexsort((ids[hits], distances))
+            output[keys[start + offset]] = [
+                (math.sqrt(d), str(vid))
+                for d, vid in zip(distances[order].tolist(), ids[hits][order].tolist())
+            ]
+    return output
+
+
+def targets_index(index, sources, radius, min_points=None, max_points=None, include=None):
+    """
+    Fallback without NumPy: one grid query per source
+    """
+    return {
+        key: index.query(x, y, radius, min_points=min_points, max_points=max_points, include=include)
+        for key, (x, y) in sources.items()
+    }
+
+
+def farm_targets(index, sources, radius, min_points=None, max_points=None, include=None):
+    """
+    Sorted (distance, vid) candidates for every source (key -> (x, y)) in one batch
+    """
+    if has_numpy:
+        return targets_numpy(index.table, sources, radius, min_points, max_points, include)
+    return targets_index(index, sources, radius, min_points, max_points, include)
+
+
+def benchmark(size=50000, source_count=200, radius=25):
+    rng = random.Random(size)
+    span = int(math.sqrt(size) * 2)
+    table = VillageTable()
+    for vid in range(1, size + 1):
+        table.set(
+            (
+                vid,
+                "",
+                500 + rng.randint(-span, span),
+                500 + rng.randint(-span, span),
+                rng.randint(26, 12000),
+                0 if rng.random() < 0.3 else rng.randint(1, 5000),
+                0,
+                None,
+            )
+        )
+    index = SpatialIndex(table)
+    for row in range(len(table)):
+        index.update(row)
+    sources = {
+        str(n): (500 + rng.randint(-span // 4, span // 4), 500 + rng.randint(-span // 4, span // 4))
+        for n in range(source_count)
+    }
+    runs = [("grid", lambda: targets_index(index, sources, radius, 0, 1000))]
+    if has_numpy:
+        runs.append(("numpy", lambda: targets_numpy(table, sources, radius, 0, 1000)))
+    results = []
+    for label, func in runs:
+        started = time.perf_counter()
+        results.append(func())
+        elapsed = time.perf_counter() - started
+        print("%d villages %d sources %-6s %8.1f ms" % (size, source_count, label, elapsed * 1000))
+    assert all(result == results[0] for result in results)
+
+
+if __name__ == "__main__":
+    # python -m core.targets
+    benchmark()
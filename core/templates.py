@@ -1,16 +1,88 @@
 import os
 import json
+import threading
+
+
+class FrozenDict(dict):
+    """
+    Read-only dict, parsed templates are shared between all villages
+    """
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError("Templates are shared and can not be modified, copy them first")
+
+    __setitem__ = __delitem__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return FrozenDict, (dict(self),)
+
+
+def freeze(value):
+    if isinstance(value, dict):
+        return FrozenDict((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
 
 
 class TemplateManager:
+    """
+    Templates are parsed once per process and reloaded when the file changes
+    """
+
+    cache = {}
+    lock = threading.Lock()
+
     @staticmethod
-    def get_template(category, template="basic", output_json=False):
-        t_path = os.path.join(
+    def template_path(category, template):
+        return os.path.join(
             os.path.dirname(__file__), "..", "templates", category, template + ".txt"
         )
-        if os.path.exists(t_path):
+
+    @staticmethod
+    def get_template(category, template="basic", output_json=False):
+        t_path = TemplateManager.template_path(category, template)
+        key = (t_path, output_json)
+        try:
+            stat = os.stat(t_path)
+        except OSError:
+            TemplateManager.cache.pop(key, None)
+            return None
+        version = (stat.st_mtime_ns, stat.st_size)
+        cached = TemplateManager.cache.get(key)
+        if cached and cached[0] == version:
+            return cached[1]
+        with TemplateManager.lock:
             with open(t_path, "r") as f:
                 if output_json:
-                    return json.load(f)
-                return f.read().strip().split()
-        return None
+                    parsed = freeze(json.load(f))
+                else:
+                    parsed = tuple(f.read().strip().split())
+            TemplateManager.cache[key] = (version, parsed)
+        return parsed
+
+    @staticmethod
+    def invalidate(category=None, template=None):
+        """
+        Drops cached templates (all, a category or a single template)
+        """
+        with TemplateManager.lock:
+            if category and template:
+                t_path = TemplateManager.template_path(category, template)
+                for key in [k for k in TemplateManager.cache if k[0] == t_path]:
+                    TemplateManager.cache.pop(key, None)
+            elif category:
+                directory = os.path.dirname(TemplateManager.template_path(category, "x"))
+                for key in [
+                    k for k in TemplateManager.cache if os.path.dirname(k[0]) == directory
+                ]:
+                    TemplateManager.cache.pop(key, None)
+            else:
+                TemplateManager.cache.clear()
@@ -0,0 +1,175 @@
+import sys
+from array import array
+from collections.abc import Mapping
+
+from core import codec
+
+
+class VillageTable:
+    """
+    Map villages stored column-wise in typed arrays, one row per village.
+    Rows use the MapStore layout: (id, name, x, y, points, owner, tribe, bonus).
+    The arrays can be used directly for filtering, villages and positions
+    are read-only views with the old dict interface.
+    """
+
+    def __init__(self):
+        self.ids = array("q")
+        self.x = array("i")
+        self.y = array("i")
+        self.points = array("i")
+        self.owner = array("q")
+        self.tribe = array("q")
+        # index into self.bonuses, the (few) distinct bonus values
+        self.bonus = array("H")
+        self.names = []
+        self.bonuses = []
+        self.bonus_codes = {}
+        # village id -> row
+        self.rows = {}
+        self.villages = VillagesView(self)
+        self.positions = PositionsView(self)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def bonus_code(self, bonus):
+        if bonus not in self.bonus_codes:
+            self.bonus_codes[bonus] = len(self.bonuses)
+            self.bonuses.append(bonus)
+        return self.bonus_codes[bonus]
+
+    def set(self, row):
+        """
+        Inserts or updates a village, returns False if nothing changed
+        """
+        vid, name, x, y, points, owner, tribe, bonus = row
+        code = self.bonus_code(bonus)
+        index = self.rows.get(vid)
+        if index is None:
+            self.rows[vid] = len(self.ids)
+            self.ids.append(vid)
+            self.names.append(name)
+            self.x.append(x)
+            self.y.append(y)
+            self.points.append(points)
+            self.owner.append(owner)
+            self.tribe.append(tribe)
+            self.bonus.append(code)
+            return True
+        if self.row(index) == (vid, name, x, y, points, owner, tribe, bonus):
+            return False
+        self.names[index] = name
+        self.x[index] = x
+        self.y[index] = y
+        self.points[index] = points
+        self.owner[index] = owner
+        self.tribe[index] = tribe
+        self.bonus[index] = code
+        return True
+
+    def row(self, index):
+        return (
+            self.ids[index],
+            self.names[index],
+            self.x[index],
+            self.y[index],
+            self.points[index],
+            self.owner[index],
+            self.tribe[index],
+            self.bonuses[self.bonus[index]],
+        )
+
+    def find(self, vid):
+        try:
+            return self.rows.get(int(vid))
+        except (TypeError, ValueError):
+            return None
+
+    def nbytes(self):
+        """
+        Approximate memory use of the table
+        """
+        size = sys.getsizeof(self.rows) + sys.getsizeof(self.names)
+        for column in (self.ids, self.x, self.y, self.points, self.owner, self.tribe, self.bonus):
+            size += column.itemsize * len(column)
+        return size + sum(sys.getsizeof(name) for name in self.names)
+
+
+class VillageEntry(Mapping):
+    """
+    Read-only village with the keys of the old map cache dict
+    """
+
+    __slots__ = ("table", "index")
+
+    keys_ = ("id", "name", "location", "bonus", "points", "safe", "scout", "tribe", "owner", "buildings", "resources")
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    def __getitem__(self, key):
+        table, index = self.table, self.index
+        if key == "id":
+            return str(table.ids[index])
+        if key == "name":
+            return table.names[index]
+        if key == "location":
+            return [table.x[index], table.y[index]]
+        if key == "points":
+            return table.points[index]
+        if key == "owner":
+            return str(table.owner[index])
+        if key == "tribe":
+            return str(table.tribe[index])
+        if key == "bonus":
+            bonus = table.bonuses[table.bonus[index]]
+            return codec.loads(bonus) if bonus else None
+        if key in ("safe", "scout"):
+            return False
+        if key in ("buildings", "resources"):
+            return {}
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.keys_)
+
+    def __len__(self):
+        return len(self.keys_)
+
+
+class VillagesView(Mapping):
+    """
+    village id (str) -> VillageEntry
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    def __getitem__(self, vid):
+        index = self.table.find(vid)
+        if index is None:
+            raise KeyError(vid)
+        return VillageEntry(self.table, index)
+
+    def __contains__(self, vid):
+        return self.table.find(vid) is not None
+
+    def __iter__(self):
+        return (str(vid) for vid in self.table.ids)
+
+    def __len__(self):
+        return len(self.table)
+
+
+class PositionsView(VillagesView):
+    """
+    village id (str) -> (x, y)
+    """
+
+    def __getitem__(self, vid):
+        index = self.table.find(vid)
+        if index is None:
+            raise KeyError(vid)
+        return self.table.x[index], self.table.y[index]
@@ -0,0 +1,120 @@
+import gzip
+import logging
+import os
+from urllib.parse import unquote_plus
+
+from core import codec
+
+
+class WorldData:
+    """
+    Streams the public world data files (village.txt, player.txt, ally.txt,
+    plain or gzipped) from a local directory into the map store.
+    Files are read line by line and compared with the stored villages,
+    the changed ones are written in batches.
+    """
+
+    logger = logging.getLogger("WorldData")
+
+    def __init__(self, directory):
+        self.directory = directory
+        # player id -> (name, tribe id), tribe id -> (name, tag)
+        self.players = {}
+        self.tribes = {}
+        self.mtimes = {}
+
+    def path(self, name):
+        for candidate in (name + ".txt.gz", name + ".txt"):
+            full = os.path.join(self.directory, candidate)
+            if os.path.exists(full):
+                return full
+        return None
+
+    def changed(self):
+        mtimes = {}
+        for name in ("village", "player", "ally"):
+            path = self.path(name)
+            if path:
+                mtimes[name] = os.path.getmtime(path)
+        return "village" in mtimes and mtimes != self.mtimes, mtimes
+
+    def updated(self):
+        """
+        Modification time of the loaded village.txt, 0 if nothing was loaded
+        """
+        return self.mtimes.get("village", 0)
+
+    @staticmethod
+    def lines(path):
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield line.split(",")
+
+    def read_tribes(self):
+        self.tribes = {}
+        path = self.path("ally")
+        if not path:
+            return
+        # id, name, tag, members, villages, points, all_points, rank
+        for row in self.lines(path):
+            self.tribes[int(row[0])] = (unquote_plus(row[1]), unquote_plus(row[2]))
+
+    def read_players(self):
+        self.players = {}
+        path = self.path("player")
+        if not path:
+            return
+        # id, name, ally, villages, points, rank
+        for row in self.lines(path):
+            self.players[int(row[0])] = (unquote_plus(row[1]), int(row[2]))
+
+    def villages(self):
+        """
+        Yields map store rows from village.txt
+        """
+        # id, name, x, y, player, points, rank
+        for row in self.lines(self.path("village")):
+            vid, owner = int(row[0]), int(row[4])
+            tribe = self.players[owner][1] if owner in self.players else 0
+            yield vid, unquote_plus(row[1]), int(row[2]), int(row[3]), int(row[5]), owner, tribe
+
+    def load(self, store, batch_size=5000):
+        """
+        Loads the files if they changed since the last call, returns the number of changed villages
+        """
+        changed, mtimes = self.changed()
+        if not changed:
+            return 0
+        self.read_tribes()
+        self.read_players()
+        none = codec.dumps(None)
+        # one snapshot of the stored villages, rows are compared with the table columns
+        table = store.load()
+        find, stored = table.find, table.row
+        written = 0
+        total = 0
+        changed = []
+        for vid, name, x, y, points, owner, tribe in self.villages():
+            index = find(vid)
+            # village.txt has no bonus information, keep the one seen on the map
+            if index is None:
+                row = (vid, name, x, y, points, owner, tribe, none)
+                changed.append(row)
+            else:
+                row = (vid, name, x, y, points, owner, tribe, table.bonuses[table.bonus[index]])
+                if stored(index) != row:
+                    changed.append(row)
+            total += 1
+            if len(changed) >= batch_size:
+                written += store.upsert(changed)
+                changed = []
+        written += store.upsert(changed)
+        self.mtimes = mtimes
+        self.logger.info(
+            "Loaded %d villages (%d changed), %d players, %d tribes"
+            % (total, written, len(self.players), len(self.tribes))
+        )
+        return written
@@ -1,7 +1,11 @@
-import time
+import atexit
+import copy
 import os
-import json
+import threading
+from core import codec
 from core.extractors import Extractor
+from core.request import FailedResponse
+from core.storage import write_json
 import logging
 import time
 from datetime import datetime
@@ -25,12 +29,12 @@ class AttackManager:
     farm_radius = 50
     farm_minpoints = 0
     farm_maxpoints = 1000
-    ignored = []
+    ignored = set()
 
     forced_peace_time = None
 
     # blocks villages which cannot be attacked at the moment (too low points, beginners protection etc..)
-    _unknown_ignored = []
+    _unknown_ignored = set()
 
     farm_high_prio_wait = 1200
     farm_default_wait = 3600
@@ -56,7 +60,7 @@ class AttackManager:
         self.get_targets()
         ignored = []
         for target in self.targets[0 : self.max_farms]:
-            if type(self.template) == list:
+            if isinstance(self.template, (list, tuple)):
                 f = False
                 for template in self.template:
                     if template in ignored:
@@ -83,6 +87,9 @@ class AttackManager:
                 attack_result = self.attack(target["id"], troops=template)
                 if attack_result == "forced_peace":
                     return 0
+                if attack_result == "budget":
+                    # not the target's fault, stop farming for this cycle
+                    return -1
                 self.logger.info(
                     "Attacking %s -> %s (%s)"
                     % (self.village_id, target["id"], str(template))
@@ -114,7 +121,7 @@ class AttackManager:
                     self.logger.debug(
                         "Ignoring target %s because unable to attack" % target["id"]
                     )
-                    self._unknown_ignored.append(target["id"])
+                    self._unknown_ignored.add(target["id"])
         else:
             self.logger.debug(
                 "Not sending additional farm because not enough units: %s" % missing
@@ -129,33 +136,19 @@ class AttackManager:
             if self.village_id in self.map.villages
             else None
         )
-        for vid in self.map.villages:
-            village = self.map.villages[vid]
-            if village["owner"] != "0" and vid not in self.extra_farm:
-                if vid not in self.ignored:
-                    self.logger.debug(
-                        "Ignoring village %s because player owned, add to additional_farms to auto attack"
-                        % vid
-                    )
-                    self.ignored.append(vid)
+        check_points = my_village and "points" in my_village
+        # the index only returns barbarian / whitelisted villages within the radius and points range
+        nearby = self.map.nearby(
+            self.farm_radius,
+            min_points=self.farm_minpoints if check_points else None,
+            max_points=self.farm_maxpoints if check_points else None,
+            include=set(self.extra_farm),
+        )
+        for distance, vid in nearby:
+            village = self.map.villages.get(vid)
+            if not village:
                 continue
-            if my_village and "points" in my_village and "points" in village:
-                if village["points"] >= self.farm_maxpoints:
-                    if vid not in self.ignored:
-                        self.logger.debug(
-                            "Ignoring village %s because points %d exceeds limit %d"
-                            % (vid, village["points"], self.farm_maxpoints)
-                        )
-                        self.ignored.append(vid)
-                    continue
-                if village["points"] <= self.farm_minpoints:
-                    if vid not in self.ignored:
-                        self.logger.debug(
-                            "Ignoring village %s because points %d below limit %d"
-                            % (vid, village["points"], self.farm_minpoints)
-                        )
-                        self.ignored.append(vid)
-                    continue
+            if check_points and "points" in village:
                 if (
                     village["points"] >= my_village["points"]
                     and not self.target_high_points
@@ -165,7 +158,7 @@ class AttackManager:
                             "Ignoring village %s because of higher points %d -> %d"
                             % (vid, my_village["points"], village["points"])
                         )
-                        self.ignored.append(vid)
+                        self.ignored.add(vid)
                     continue
                 if vid in self._unknown_ignored:
                     continue
@@ -177,24 +170,16 @@ class AttackManager:
                         % vid
                     )
                     continue
-            distance = self.map.get_dist(village["location"])
-            if distance > self.farm_radius:
-                if vid not in self.ignored:
-                    self.logger.debug(
-                        "Village %s will be ignored because it is too far away: distance is %f, max is %d"
-                        % (vid, distance, self.farm_radius)
-                    )
-                    self.ignored.append(vid)
-                continue
             if vid in self.ignored:
                 self.logger.debug("Removed %s from farm ignore list" % vid)
-                self.ignored.remove(vid)
+                self.ignored.discard(vid)
 
             output.append([village, distance])
         self.logger.info(
-            "Farm targets: %d Ignored targets: %d" % (len(output), len(self.ignored))
+            "Farm targets: %d Ignored targets: %d"
+            % (len(output), len(self.map.villages) - len(output))
         )
-        self.targets = sorted(output, key=lambda x: x[1])
+        self.targets = output
 
     def attacked(
         self, vid, scout=False, high_profile=False, safe=True, low_profile=False
@@ -206,7 +191,7 @@ class AttackManager:
             "low_profile": low_profile,
             "last_attack": int(time.time()),
         }
-        AttackCache.set_cache(vid, cache_entry)
+        AttackCache.set_cache(vid, cache_entry, defer=self.wrapper.defer if self.wrapper else None)
 
     def scout(self, vid):
         if (
@@ -218,7 +203,8 @@ class AttackManager:
             )
             return False
         troops = {"spy": 5}
-        if self.attack(vid, troops=troops):
+        result = self.attack(vid, troops=troops)
+        if result and result not in ("forced_peace", "budget"):
             self.attacked(vid, scout=True, safe=False)
 
     def can_attack(self, vid, clear=False):
@@ -322,6 +308,10 @@ class AttackManager:
     def attack(self, vid, troops=None):
         url = "game.php?village=%s&screen=place&target=%s" % (self.village_id, vid)
         pre_attack = self.wrapper.get_url(url)
+        if FailedResponse.is_budget(pre_attack):
+            return "budget"
+        if not pre_attack:
+            return False
         pre_data = {}
         for u in Extractor.attack_form(pre_attack):
             k, v = u
@@ -340,11 +330,7 @@ class AttackManager:
 
         confirm_url = "game.php?village=%s&screen=place&try=confirm" % self.village_id
         conf = self.wrapper.post_url(url=confirm_url, data=pre_data)
-        if (
-            conf is not None
-            and hasattr(conf, "text")
-            and '<div class="error_box">' in conf.text
-        ):
+        if not conf or '<div class="error_box">' in conf.text:
             return False
         duration = Extractor.attack_duration(conf)
         if self.forced_peace_time:
@@ -383,34 +369,97 @@ class AttackManager:
 
 
 class AttackCache:
+    """
+    Attack state of all farm targets, loaded from cache/attacks once and shared by
+    every AttackManager and the farm manager. Callers get copies, changes go
+    through set_cache. Profile changes stay in memory and are written in batches,
+    a new last_attack is written right away so a crash can not lose it.
+    Every file is replaced atomically.
+    """
+
+    entries = None
+    dirty = set()
+    lock = threading.RLock()
+    flush_interval = 60
+    last_flush = 0
+
+    @staticmethod
+    def path(village_id=None):
+        directory = os.path.join(os.path.dirname(__file__), "..", "cache", "attacks")
+        if village_id is None:
+            return directory
+        return os.path.join(directory, village_id + ".json")
+
+    @staticmethod
+    def load():
+        with AttackCache.lock:
+            if AttackCache.entries is not None:
+                return AttackCache.entries
+            entries = {}
+            c_path = AttackCache.path()
+            if os.path.isdir(c_path):
+                for existing in os.listdir(c_path):
+                    if not existing.endswith(".json"):
+                        continue
+                    with open(os.path.join(c_path, existing), "r", encoding="utf-8") as f:
+                        entries[existing.replace(".json", "")] = codec.load(f)
+            AttackCache.entries = entries
+            AttackCache.last_flush = time.time()
+            atexit.register(AttackCache.flush)
+            return entries
+
     @staticmethod
     def get_cache(village_id):
-        t_path = os.path.join(
-            os.path.dirname(__file__), "..", "cache", "attacks", village_id + ".json"
-        )
-        if os.path.exists(t_path):
-            with open(t_path, "r") as f:
-                return json.load(f)
-        return None
+        with AttackCache.lock:
+            entry = AttackCache.load().get(village_id)
+            return dict(entry) if entry is not None else None
 
     @staticmethod
-    def set_cache(village_id, entry):
-        t_path = os.path.join(
-            os.path.dirname(__file__), "..", "cache", "attacks", village_id + ".json"
-        )
-        with open(t_path, "w") as f:
-            return json.dump(entry, f)
+    def set_cache(village_id, entry, defer=None):
+        """
+        Updates the entry in memory, a flush is started (through defer if given)
+        when the village was attacked or once flush_interval passed since the last one
+        """
+        with AttackCache.lock:
+            entries = AttackCache.load()
+            previous = entries.get(village_id) or {}
+            entries[village_id] = dict(entry)
+            AttackCache.dirty.add(village_id)
+            due = (
+                previous.get("last_attack") != entry.get("last_attack")
+                or AttackCache.last_flush + AttackCache.flush_interval < time.time()
+            )
+            if due:
+                AttackCache.last_flush = time.time()
+        if due:
+            if defer:
+                defer(AttackCache.flush)
+            else:
+                AttackCache.flush()
+        return True
+
+    @staticmethod
+    def flush():
+        """
+        Writes all changed entries, entries that fail are retried on the next flush
+        """
+        with AttackCache.lock:
+            if not AttackCache.dirty:
+                return 0
+            batch = {vid: dict(AttackCache.entries[vid]) for vid in AttackCache.dirty}
+            AttackCache.dirty = set()
+            AttackCache.last_flush = time.time()
+        written = 0
+        for vid, entry in batch.items():
+            try:
+                write_json(AttackCache.path(vid), entry)
+                written += 1
+            except OSError:
+                with AttackCache.lock:
+                    AttackCache.dirty.add(vid)
+        return written
 
     @staticmethod
     def cache_grab():
-        output = {}
-        c_path = os.path.join(os.path.dirname(__file__), "..", "cache", "attacks")
-        for existing in os.listdir(c_path):
-            if not existing.endswith(".json"):
-                continue
-            t_path = os.path.join(
-                os.path.dirname(__file__), "..", "cache", "attacks", existing
-            )
-            with open(t_path, "r") as f:
-                output[existing.replace(".json", "")] = json.load(f)
-        return output
+        with AttackCache.lock:
+            return copy.deepcopy(AttackCache.load())
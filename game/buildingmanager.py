@@ -3,6 +3,8 @@ import random
 import re
 import time
 
+from core.buildingdata import BuildingData
+from core.buildplan import BuildPlan, BuildTemplate
 from core.extractors import Extractor
 
 
@@ -12,7 +14,7 @@ class BuildingManager:
 
     max_lookahead = 2
 
-    queue = []
+    plan = None
     waits = []
     waits_building = []
 
@@ -30,6 +32,25 @@ class BuildingManager:
     def __init__(self, wrapper, village_id):
         self.wrapper = wrapper
         self.village_id = village_id
+        self.levels = {}
+        self.waits = []
+        self.waits_building = []
+
+    @property
+    def queue(self):
+        if not self.plan:
+            return []
+        return self.plan.remaining(self.levels)
+
+    def set_template(self, lines):
+        """
+        Compiles a builder template, progress is kept while the template does not change
+        """
+        template = BuildTemplate.compile(lines or [])
+        if not self.plan or self.plan.template is not template:
+            self.plan = BuildPlan(template)
+            return True
+        return False
 
     def create_update_links(self, extracted_buildings):
         link = self.game_state["link_base_pure"] + "main&action=upgrade_building"
@@ -44,6 +65,8 @@ class BuildingManager:
 
     def start_update(self, build=False, set_village_name=None):
         main_data = self.wrapper.get_action(village_id=self.village_id, action="main")
+        if not main_data:
+            return False
         self.game_state = Extractor.game_state(main_data)
         vname = self.game_state["village"]["name"]
 
@@ -68,7 +91,8 @@ class BuildingManager:
             )
 
         self.logger.debug("Updating building levels")
-        tmp = self.game_state["village"]["buildings"]
+        # copy, the game state is shared with other users of the same (cached) page
+        tmp = dict(self.game_state["village"]["buildings"])
         for e in tmp:
             tmp[e] = int(tmp[e])
         self.levels = tmp
@@ -110,7 +134,7 @@ class BuildingManager:
                 return False
         # Check for instant build after putting something in the queue
         main_data = self.wrapper.get_action(village_id=self.village_id, action="main")
-        if self.complete_actions(main_data.text):
+        if main_data and self.complete_actions(main_data.text):
             self.can_build_three_min = True
             return self.start_update(build=build, set_village_name=set_village_name)
         return True
@@ -155,17 +179,7 @@ class BuildingManager:
             or build_item["wood"] > self.resource_manager.storage
             or build_item["stone"] > self.resource_manager.storage
         ):
-            build_data = "storage:%d" % (int(self.levels["storage"]) + 1)
-            if (
-                len(self.queue)
-                and "storage"
-                not in [x.split(":")[0] for x in self.queue[0 : self.max_lookahead]]
-                and int(self.levels["storage"]) != 30
-            ):
-                self.queue.insert(0, build_data)
-                self.logger.info(
-                    "Adding storage in front of queue because queue item exceeds storage capacity"
-                )
+            self.prioritize("storage", "queue item exceeds storage capacity")
 
         r = True
         if build_item["wood"] > self.game_state["village"]["wood"]:
@@ -208,45 +222,61 @@ class BuildingManager:
 
         return "%d:%02d:%02d" % (hour, minutes, seconds)
 
-    def get_next_building_action(self, index=0):
-        if index >= self.max_lookahead:
-            self.logger.debug("Not building anything because insufficient resources")
-            return False
+    def prioritize(self, building, reason):
+        """
+        Puts the next level of a building in front of the plan (if not already upcoming)
+        """
+        level = self.get_level(building)
+        if (
+            self.plan
+            and self.plan.has_pending(self.levels)
+            and building not in self.plan.lookahead(self.levels, self.max_lookahead)
+            and level < BuildingData.max_level(building)
+        ):
+            self.plan.prioritize(building, level + 1)
+            self.logger.info("Adding %s in front of queue because %s" % (building, reason))
+            return True
+        return False
 
+    def get_next_building_action(self):
         queue_check = self.is_queued()
         if queue_check:
             self.logger.debug("Not building because of queued items: %s" % self.waits)
             return False
 
+        if not self.plan:
+            return False
+
         if self.resource_manager and self.resource_manager.in_need_of("pop"):
-            build_data = "farm:%d" % (int(self.levels["farm"]) + 1)
+            self.prioritize("farm", "low on pop")
+
+        checked = 0
+        for index, step in self.plan.pending(self.levels):
+            if checked >= self.max_lookahead:
+                break
+            entry, min_lvl = step
+            requirement = self.plan.requirement(index, step, self.levels)
             if (
-                len(self.queue)
-                and "farm"
-                not in [x.split(":")[0] for x in self.queue[0 : self.max_lookahead]]
-                and int(self.levels["farm"]) != 30
+                requirement
+                and self.resource_manager
+                and self.resource_manager.storage
+                and max(requirement["wood"], requirement["stone"], requirement["iron"])
+                > self.resource_manager.storage
+                and self.prioritize("storage", "%s %d exceeds storage capacity" % step)
             ):
-                self.queue.insert(0, build_data)
-                self.logger.info("Adding farm in front of queue because low on pop")
-                return self.get_next_building_action(0)
-
-        if len(self.queue):
-            entry = self.queue[index]
-            entry, min_lvl = entry.split(":")
-            min_lvl = int(min_lvl)
-            if min_lvl <= self.levels[entry]:
-                self.queue.pop(index)
-                return self.get_next_building_action(index=index)
+                return self.get_next_building_action()
+            checked += 1
             if entry not in self.costs:
                 self.logger.debug("Ignoring %s because not yet available" % entry)
-                return self.get_next_building_action(index + 1)
+                continue
             check = self.costs[entry]
             if "max_level" in check and min_lvl > check["max_level"]:
                 self.logger.debug(
                     "Removing entry %s because max_level exceeded" % entry
                 )
-                self.queue.pop(index)
-                return self.get_next_building_action(index=index)
+                self.plan.drop(index, step)
+                checked -= 1
+                continue
             if check["can_build"] and self.has_enough(check) and "build_link" in check:
                 queue = self.put_wait(check["build_time"])
                 self.logger.info(
@@ -274,12 +304,8 @@ class BuildingManager:
                 if self.can_build_three_min:
                     # Wait some random time
                     time.sleep(random.randint(3, 7) / 10)
-                    result = self.complete_actions(text=response.text)
-                    if result:
-                        # Remove first item from the queue
-                        self.queue.pop(0)
-                        index -= 1
-                    # Building was completed, queueing another
+                    # a completed build simply satisfies its plan step
+                    self.complete_actions(text=response.text)
                 self.game_state = Extractor.game_state(response)
                 self.costs = Extractor.building_data(response)
                 # Trigger function again because game state is changed
@@ -288,5 +314,6 @@ class BuildingManager:
                     # Build something, remove request
                     self.resource_manager.requested["building"] = {}
                 return True
-            else:
-                return self.get_next_building_action(index + 1)
+
+        self.logger.debug("Not building anything because insufficient resources")
+        return False
@@ -3,6 +3,7 @@ import logging
 import re
 
 from core.extractors import Extractor
+from core.request import RequestScheduler
 
 
 class DefenceManager:
@@ -65,7 +66,8 @@ class DefenceManager:
             "Sending requested support to village %s: %s"
             % (requesting_village, str(send_support))
         )
-        return self.support(requesting_village, troops=send_support)
+        with self.wrapper.scheduler.use(RequestScheduler.DEFENCE):
+            return self.support(requesting_village, troops=send_support)
 
     def update(self, main, with_defence=False):
         ok = True
@@ -127,7 +129,8 @@ class DefenceManager:
                 self.logger.info(
                     "Evacuating troops from village %s: %s" % (vid, str(to_hide))
                 )
-                self.support(vid, troops=to_hide)
+                with self.wrapper.scheduler.use(RequestScheduler.DEFENCE):
+                    self.support(vid, troops=to_hide)
                 return True
 
     def flag_logic(self, set_flag):
@@ -193,6 +196,8 @@ class DefenceManager:
 
         url = "game.php?village=%s&screen=flags" % self.village_id
         result = self.wrapper.get_url(url=url)
+        if not result:
+            return
 
         self._can_change_flag = '<span class="timer cooldown">' not in result.text
 
@@ -232,6 +237,8 @@ class DefenceManager:
     def support(self, vid, troops=None):
         url = "game.php?village=%s&screen=place&target=%s" % (self.village_id, vid)
         pre_support = self.wrapper.get_url(url)
+        if not pre_support:
+            return False
         pre_data = {}
         for u in Extractor.attack_form(pre_support):
             k, v = u
@@ -250,7 +257,7 @@ class DefenceManager:
 
         confirm_url = "game.php?village=%s&screen=place&try=confirm" % self.village_id
         conf = self.wrapper.post_url(url=confirm_url, data=pre_data)
-        if '<div class="error_box">' in conf.text:
+        if not conf or '<div class="error_box">' in conf.text:
             return False
         duration = Extractor.attack_duration(conf)
         self.logger.info(
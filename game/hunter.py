@@ -3,6 +3,7 @@ import logging
 import time
 
 from core.extractors import Extractor
+from core.request import RequestScheduler
 from game.simulator import Simulator
 
 
@@ -55,14 +56,14 @@ class Hunter:
         for attack in data:
             result, duration = self.attack(source, item, troops=attack)
             attack_set.append(result)
-        self.wrapper.priority_mode = True
-        while time.time() < exact_send_time:
-            time.sleep(0.001)
-        a = datetime.datetime.now()
-        for attk in attack_set:
-            time.sleep(1000 / min_sleep_amount_millis)
-            self.send_attack(source, attk)
-        b = datetime.datetime.now()
+        with self.wrapper.scheduler.use(RequestScheduler.TIMED):
+            while time.time() < exact_send_time:
+                time.sleep(0.001)
+            a = datetime.datetime.now()
+            for attk in attack_set:
+                time.sleep(1000 / min_sleep_amount_millis)
+                self.send_attack(source, attk)
+            b = datetime.datetime.now()
         diff = b - a
         millis = 0
         millis += diff.seconds * 1000
@@ -70,11 +71,12 @@ class Hunter:
         self.logger.info(
             "Sent %d attacks in %d milliseconds" % (len(attack_set), millis)
         )
-        self.wrapper.priority_mode = False
 
     def attack(self, source, vid, troops=None):
         url = "game.php?village=%s&screen=place&target=%s" % (source, vid)
         pre_attack = self.wrapper.get_url(url)
+        if not pre_attack:
+            return False
         pre_data = {}
         for u in Extractor.attack_form(pre_attack):
             k, v = u
@@ -91,7 +93,7 @@ class Hunter:
 
         confirm_url = "game.php?village=%s&screen=place&try=confirm" % self.village_id
         conf = self.wrapper.post_url(url=confirm_url, data=pre_data)
-        if '<div class="error_box">' in conf.text:
+        if not conf or '<div class="error_box">' in conf.text:
             return False
         duration = Extractor.attack_duration(conf)
         confirm_data = {}
@@ -121,6 +123,8 @@ class Hunter:
     def prepare(self, vid, troops=None):
         url = "game.php?village=%s&screen=place&target=%s" % (self.village_id, vid)
         pre_attack = self.wrapper.get_url(url)
+        if not pre_attack:
+            return False
         pre_data = {}
         for u in Extractor.attack_form(pre_attack):
             k, v = u
@@ -134,7 +138,7 @@ class Hunter:
 
         confirm_url = "game.php?village=%s&screen=place&try=confirm" % self.village_id
         conf = self.wrapper.post_url(url=confirm_url, data=pre_data)
-        if '<div class="error_box">' in conf.text:
+        if not conf or '<div class="error_box">' in conf.text:
             return False
         duration = Extractor.attack_duration(conf)
 
@@ -1,156 +1,359 @@
-import json
+import hashlib
 import math
-import os
 import time
 
+from core import codec
 from core.extractors import Extractor
+from core.mapstore import MapStore
+from core.spatial import SpatialIndex
+from core.targets import farm_targets
+from core.worlddata import WorldData
+
+
+class WorldMap:
+    """
+    Map data of the whole world, shared by all villages of the account.
+    Sectors are merged once per refresh period, a village only fetches
+    the map screen when the sectors around it are not known (or outdated).
+    """
+
+    instance = None
+
+    # size of a map sector (TWMap sectorPrefetch tile)
+    sector_size = 20
+    fetch_delay = 8
+
+    def __init__(self, store=None):
+        self.store = store or MapStore.shared()
+        # the villages of the map store, one table per process
+        self.table = self.store.load()
+        # read-only views on the table: id -> village, id -> (x, y)
+        self.villages = self.table.villages
+        self.map_pos = self.table.positions
+        self.index = SpatialIndex(self.table)
+        self.index.sync()
+        # sector origin -> time the sector was last seen, content hash
+        self.sectors = {}
+        self.hashes = {}
+        self.pending = []
+        self.world_data = None
+        # village id -> location of the own villages, farm targets of this cycle per filter set
+        self.sources = {}
+        self.target_cache = {}
+
+    @staticmethod
+    def shared():
+        if not WorldMap.instance:
+            WorldMap.instance = WorldMap()
+        return WorldMap.instance
+
+    def sector(self, x, y):
+        size = self.sector_size
+        return int(x) // size * size, int(y) // size * size
+
+    @staticmethod
+    def digest(vdata):
+        return hashlib.sha1(codec.dumps(vdata).encode("utf-8")).hexdigest()
+
+    def is_fresh(self, sector):
+        return self.sectors.get(sector, 0) + (self.fetch_delay * 3600) > time.time()
+
+    def covers(self, location):
+        """
+        True if the sector of location and the ones around it are up to date
+        """
+        if not location:
+            return False
+        if self.world_data and self.world_data.updated() + (self.fetch_delay * 3600) > time.time():
+            # recent world data files cover the whole map, unless the village is newer than the files
+            if self.index.find(*location) is not None:
+                return True
+        size = self.sector_size
+        sx, sy = self.sector(*location)
+        for dx in (-size, 0, size):
+            for dy in (-size, 0, size):
+                if not self.is_fresh((sx + dx, sy + dy)):
+                    return False
+        return True
+
+    def merge(self, map_data, village_id):
+        """
+        Merges the sectors of a map page. Sectors already merged by a nearby village,
+        or with the same content as last time, are skipped.
+        Returns the location of village_id if it is known
+        """
+        location = None
+        now = time.time()
+        for tile in map_data:
+            data = tile["data"]
+            x = int(data["x"])
+            y = int(data["y"])
+            sector = self.sector(x, y)
+            vdata = data["villages"]
+            if self.is_fresh(sector):
+                continue
+            self.sectors[sector] = now
+            digest = self.digest(vdata)
+            if self.hashes.get(sector) == digest:
+                # nothing changed since the last refresh of this sector
+                continue
+            self.hashes[sector] = digest
+            # Fix broken parsing
+            if type(vdata) is dict:
+                cdata = [{}] * 20
+                for k, v in vdata.items():
+                    if type(v) is not dict:
+                        cdata[int(k)] = {0: item[0:] for item in v}
+                    else:
+                        cdata[int(k)] = v
+                vdata = cdata
+            for lon, val in enumerate(vdata):
+                if not val:
+                    continue
+                # Force dict type to iterate properly
+                if type(val) != dict:
+                    val = {i: val[i] for i in range(0, len(val))}
+                for lat, entry in val.items():
+                    if not lat:
+                        continue
+                    coords = [x + int(lon), y + int(lat)]
+                    if entry[0] == str(village_id):
+                        location = coords
+                    self.build_cache_entry(location=coords, entry=entry)
+        if not location and str(village_id) in self.map_pos:
+            location = self.map_pos[str(village_id)]
+        return location
+
+    def merge_old(self, map_data, village_id):
+        location = None
+        for tile in map_data:
+            data = tile["data"]
+            x = int(data["x"])
+            y = int(data["y"])
+            vdata = data["villages"]
+            for lon, lon_val in enumerate(vdata):
+                for lat in vdata[lon]:
+                    coords = [x + int(lon), y + int(lat)]
+                    entry = vdata[lon][lat]
+                    if entry[0] == str(village_id):
+                        location = coords
+                    self.build_cache_entry(location=coords, entry=entry)
+        return location
+
+    def build_cache_entry(self, location, entry):
+        """
+        Adds a village of a map sector, returns False if it did not change
+        """
+        vid = entry[0]
+        name = entry[2]
+        points = int(entry[3].replace(".", ""))
+        player = entry[4]
+        bonus = entry[6]
+        clan = entry[11]
+        row = (
+            int(vid),
+            name,
+            int(location[0]),
+            int(location[1]),
+            points,
+            int(player or 0),
+            int(clan or 0),
+            codec.dumps(bonus),
+        )
+        if not self.add_row(row):
+            return False
+        self.pending.append(row)
+        return True
+
+    def add_row(self, row):
+        """
+        Adds a map store row to the in-memory map, returns False if it did not change.
+        Changed rows are written to the store by save
+        """
+        with self.store.lock:
+            if not self.table.set(row):
+                return False
+        self.index.update(self.table.rows[row[0]])
+        return True
+
+    def load_world_data(self, directory):
+        """
+        Full world coverage from village.txt / player.txt / ally.txt, reloaded when the files change
+        """
+        if not self.world_data or self.world_data.directory != directory:
+            self.world_data = WorldData(directory)
+        return self.world_data.load(self.store)
+
+    def set_sources(self, locations):
+        """
+        Own villages (village id -> location) at the start of a cycle. Farm targets are
+        computed for all of them in one batch and reused for the rest of the cycle
+        """
+        self.sources = {str(vid): tuple(location) for vid, location in locations.items()}
+        self.target_cache = {}
+
+    def targets(self, source, location, radius, min_points=None, max_points=None, include=None):
+        """
+        Farm candidates around one own village, from the batch of the current cycle.
+        Villages that were not known when the cycle started are computed on their own
+        """
+        source, location = str(source), tuple(location)
+        key = (radius, min_points, max_points, frozenset(include or ()))
+        results = self.target_cache.get(key)
+        if results is None:
+            self.sources[source] = location
+            results = farm_targets(
+                self.index,
+                self.sources,
+                radius,
+                min_points=min_points,
+                max_points=max_points,
+                include=include,
+            )
+            self.target_cache[key] = results
+        elif self.sources.get(source) != location or source not in results:
+            self.sources[source] = location
+            results.update(
+                farm_targets(
+                    self.index,
+                    {source: location},
+                    radius,
+                    min_points=min_points,
+                    max_points=max_points,
+                    include=include,
+                )
+            )
+        return results[source]
+
+    def save(self, wrapper=None):
+        """
+        Writes the villages of this refresh to the map store in one transaction
+        """
+        rows, self.pending = self.pending, []
+        if not rows:
+            return
+        # the rows are in the shared table already, they are written without comparing
+        if wrapper:
+            wrapper.defer(self.store.write, rows)
+        else:
+            self.store.write(rows)
 
 
 class Map:
+    """
+    View on the world map from a single village: its own origin and distance cache
+    """
+
     wrapper = None
     village_id = None
     map_data = []
-    villages = {}
     my_location = None
-    map_pos = {}
     last_fetch = 0
     fetch_delay = 8
 
-    def __init__(self, wrapper=None, village_id=None):
+    def __init__(self, wrapper=None, village_id=None, world=None):
         self.wrapper = wrapper
         self.village_id = village_id
+        self.world = world or WorldMap.shared()
+        self.store = self.world.store
+        self.distances = {}
+
+    @property
+    def villages(self):
+        return self.world.villages
+
+    @property
+    def map_pos(self):
+        return self.world.map_pos
+
+    @property
+    def index(self):
+        return self.world.index
+
+    def set_location(self, location):
+        if location and tuple(location) != self.my_location:
+            self.my_location = (int(location[0]), int(location[1]))
+            self.distances = {}
 
     def get_map(self):
         if self.last_fetch + (self.fetch_delay * 3600) > time.time():
             return
-        self.last_fetch = time.time()
+        self.set_location(self.map_pos.get(str(self.village_id)))
+        if self.world.covers(self.my_location):
+            # a nearby village already fetched this part of the map
+            self.last_fetch = time.time()
+            return True
         res = self.wrapper.get_action(village_id=self.village_id, action="map")
+        if not res:
+            return False
+        self.last_fetch = time.time()
         game_state = Extractor.game_state(res)
         self.map_data = Extractor.map_data(res)
         if self.map_data:
-            for tile in self.map_data:
-                data = tile["data"]
-                x = int(data["x"])
-                y = int(data["y"])
-                vdata = data["villages"]
-                # Fix broken parsing
-                if type(vdata) is dict:
-                    cdata = [{}] * 20
-                    for k, v in vdata.items():
-                        if type(v) is not dict:
-                            cdata[int(k)] = {0: item[0:] for item in v}
-                        else:
-                            cdata[int(k)] = v
-                    vdata = cdata
-                for lon, val in enumerate(vdata):
-                    if not val:
-                        continue
-                    # Force dict type to iterate properly
-                    if type(val) != dict:
-                        val = {i: val[i] for i in range(0, len(val))}
-                    for lat, entry in val.items():
-                        if not lat:
-                            continue
-                        coords = [x + int(lon), y + int(lat)]
-                        if entry[0] == str(self.village_id):
-                            self.my_location = coords
-
-                        self.build_cache_entry(location=coords, entry=entry)
-                if not self.my_location:
-                    self.my_location = [
-                        game_state["village"]["x"],
-                        game_state["village"]["y"],
-                    ]
+            self.set_location(self.world.merge(self.map_data, self.village_id))
+            if not self.my_location:
+                self.set_location(
+                    [game_state["village"]["x"], game_state["village"]["y"]]
+                )
         if not self.map_data or not self.villages:
             return self.get_map_old(game_state=game_state)
+        self.world.save(self.wrapper)
         return True
 
     def get_map_old(self, game_state):
         if self.map_data:
-            for tile in self.map_data:
-                data = tile["data"]
-                x = int(data["x"])
-                y = int(data["y"])
-                vdata = data["villages"]
-                for lon, lon_val in enumerate(vdata):
-                    try:
-                        for lat in vdata[lon]:
-                            coords = [x + int(lon), y + int(lat)]
-                            entry = vdata[lon][lat]
-                            if entry[0] == str(self.village_id):
-                                self.my_location = coords
-
-                            self.build_cache_entry(location=coords, entry=entry)
-                    except:
-                        raise
+            self.set_location(self.world.merge_old(self.map_data, self.village_id))
             if not self.my_location:
-                self.my_location = [
-                    game_state["village"]["x"],
-                    game_state["village"]["y"],
-                ]
+                self.set_location(
+                    [game_state["village"]["x"], game_state["village"]["y"]]
+                )
         if not self.map_data or not self.villages:
             print(
                 "Error reading map state for village %s, farming might not work properly"
                 % self.village_id
             )
             return False
+        self.world.save(self.wrapper)
         return True
 
     def build_cache_entry(self, location, entry):
-        vid = entry[0]
-        name = entry[2]
-        points = int(entry[3].replace(".", ""))
-        player = entry[4]
-        bonus = entry[6]
-        clan = entry[11]
-        structure = {
-            "id": vid,
-            "name": name,
-            "location": location,
-            "bonus": bonus,
-            "points": points,
-            "safe": False,
-            "scout": False,
-            "tribe": clan,
-            "owner": player,
-            "buildings": {},
-            "resources": {},
-        }
-        self.map_pos[vid] = location
-        cached = self.in_cache(vid)
-        if not cached:
-            MapCache.set_cache(village_id=vid, entry=structure)
-        if cached and cached != structure:
-            MapCache.set_cache(village_id=vid, entry=structure)
-        self.villages[vid] = structure
+        return self.world.build_cache_entry(location, entry)
 
     def in_cache(self, vid):
-        entry = MapCache.get_cache(village_id=vid)
-        return entry
+        row = self.store.get(vid)
+        return MapStore.row_to_entry(row) if row else None
 
-    def get_dist(self, ext_loc):
-        distance = math.sqrt(
-            ((self.my_location[0] - ext_loc[0]) ** 2)
-            + ((self.my_location[1] - ext_loc[1]) ** 2)
+    def nearby(self, radius, min_points=None, max_points=None, include=None):
+        """
+        Barbarian (or included) villages around this village as (distance, vid), nearest first
+        """
+        if not self.my_location:
+            return []
+        return self.world.targets(
+            self.village_id,
+            self.my_location,
+            radius,
+            min_points=min_points,
+            max_points=max_points,
+            include=include,
         )
-        return distance
+
+    def get_dist(self, ext_loc):
+        key = (ext_loc[0], ext_loc[1])
+        if key not in self.distances:
+            self.distances[key] = math.sqrt(
+                ((self.my_location[0] - ext_loc[0]) ** 2)
+                + ((self.my_location[1] - ext_loc[1]) ** 2)
+            )
+        return self.distances[key]
 
 
 class MapCache:
     @staticmethod
     def get_cache(village_id):
-        t_path = os.path.join(
-            os.path.dirname(__file__), "..", "cache", "villages", village_id + ".json"
-        )
-        if os.path.exists(t_path):
-            with open(t_path, "r") as f:
-                return json.load(f)
-        return None
+        row = MapStore.shared().get(village_id)
+        return MapStore.row_to_entry(row) if row else None
 
     @staticmethod
     def set_cache(village_id, entry):
-        t_path = os.path.join(
-            os.path.dirname(__file__), "..", "cache", "villages", village_id + ".json"
-        )
-        with open(t_path, "w") as f:
-            return f.write(json.dumps(entry))
+        return MapStore.shared().upsert([MapStore.entry_to_row(entry)])
@@ -1,10 +1,13 @@
-import json
 import logging
 import os
 import re
 from datetime import datetime
 
+from core import codec
 from core.extractors import Extractor
+from core.page import ParsedPage
+from core.request import FailedResponse
+from core.storage import write_json
 
 
 class ReportManager:
@@ -90,6 +93,11 @@ class ReportManager:
         if page > 0:
             url += "&from=%d" % offset
         result = self.wrapper.get_url(url)
+        if not result:
+            if FailedResponse.is_budget(result):
+                self.logger.info("Report budget used, continuing at page %d next cycle" % page)
+            self.wrapper.drain()
+            return
         self.game_state = Extractor.game_state(result)
         new = 0
 
@@ -103,24 +111,33 @@ class ReportManager:
                 report_id,
             )
             data = self.wrapper.get_url(url)
-
-            get_type = re.search(r'class="report_(\w+)', data.text)
-            if get_type:
-                report_type = get_type.group(1)
-                if report_type == "ReportAttack":
-                    self.attack_report(data.text, report_id)
-                    continue
-
-                else:
-                    res = self.put(report_id, report_type=report_type)
-                    self.last_reports[report_id] = res
+            if FailedResponse.is_budget(data):
+                # the remaining reports are read next cycle
+                self.logger.info("Report budget used, %s and newer reports are read next cycle" % report_id)
+                self.wrapper.drain()
+                return
+            if not data:
+                continue
+            # parsed while the next report is being requested
+            self.wrapper.defer(self.process_report, report_id, data)
         if new == 12 or full_run and page < 20:
             page += 1
             self.logger.debug(
                 "%d new reports where added, also checking page %d" % (new, page)
             )
             return self.read(page, full_run=full_run)
-
+        self.wrapper.drain()
+
+    def process_report(self, report_id, data):
+        text = ParsedPage.of(data).text
+        get_type = re.search(r'class="report_(\w+)', text)
+        if get_type:
+            report_type = get_type.group(1)
+            if report_type == "ReportAttack":
+                self.attack_report(text, report_id)
+            else:
+                res = self.put(report_id, report_type=report_type)
+                self.last_reports[report_id] = res
 
     def re_unit(self, inp):
         output = {}
@@ -228,7 +245,7 @@ class ReportManager:
             )
             if scout_buildings:
                 raw = scout_buildings.group(1).replace("&quot;", '"')
-                extra["buildings"] = self.re_building(json.loads(raw))
+                extra["buildings"] = self.re_building(codec.loads(raw))
             found_res = {}
             for loot_entry in re.findall(
                 r'<span class="icon header (wood|stone|iron)".+?</span>(\d+)',
@@ -280,8 +297,8 @@ class ReportCache:
             os.path.dirname(__file__), "..", "cache", "reports", report_id + ".json"
         )
         if os.path.exists(t_path):
-            with open(t_path, "r") as f:
-                return json.load(f)
+            with open(t_path, "r", encoding="utf-8") as f:
+                return codec.load(f)
         return None
 
     @staticmethod
@@ -289,8 +306,7 @@ class ReportCache:
         t_path = os.path.join(
             os.path.dirname(__file__), "..", "cache", "reports", report_id + ".json"
         )
-        with open(t_path, "w") as f:
-            return json.dump(entry, f)
+        return write_json(t_path, entry)
 
     @staticmethod
     def cache_grab():
@@ -302,6 +318,6 @@ class ReportCache:
             t_path = os.path.join(
                 os.path.dirname(__file__), "..", "cache", "reports", existing
             )
-            with open(t_path, "r") as f:
-                output[existing.replace(".json", "")] = json.load(f)
+            with open(t_path, "r", encoding="utf-8") as f:
+                output[existing.replace(".json", "")] = codec.load(f)
         return output
@@ -69,6 +69,8 @@ class TroopManager:
         main_data = self.wrapper.get_action(
             action="overview", village_id=self.village_id
         )
+        if not main_data:
+            return
         self.game_data = Extractor.game_state(main_data)
 
         if self.resource_manager:
@@ -163,7 +165,7 @@ class TroopManager:
         wanted_upgrades = {}
 
         # Check if self.template is not None and is iterable
-        if self.template and isinstance(self.template, list):
+        if self.template and isinstance(self.template, (list, tuple)):
             for x in self.template:
                 if x["building"] not in levels:
                     return last
@@ -1,4 +1,4 @@
-import json
+import copy
 import logging
 import os
 import time
@@ -6,8 +6,9 @@ from codecs import decode
 from datetime import datetime
 
 from core.extractors import Extractor
+from core.request import RequestScheduler
+from core.storage import write_json
 from core.templates import TemplateManager
-from core.twstats import TwStats
 from game.attack import AttackManager
 from game.buildingmanager import BuildingManager
 from game.defence_manager import DefenceManager
@@ -36,8 +37,6 @@ class Village:
     config = None
     village_set_name = None
 
-    twp = TwStats()
-
     def __init__(self, village_id=None, wrapper=None):
         self.entry = None
         self.disabled_units = []
@@ -69,6 +68,14 @@ class Village:
         return vdata[parameter]
 
     def run(self, config=None):
+        # Screens are only fetched once per cycle unless the village state was changed
+        self.wrapper.start_cycle()
+        try:
+            return self.run_cycle(config=config)
+        finally:
+            self.wrapper.end_cycle()
+
+    def run_cycle(self, config=None):
         self.config = config
         self.wrapper.delay = self.get_config(section="bot", parameter="delay_factor", default=1.0)
 
@@ -153,7 +160,7 @@ class Village:
 
         self.resource_manager.update(self.game_data)
         self.wrapper.reporter.report(
-            self.village_id, "TWB_PRE_RESOURCE", str(self.resource_manager.actual)
+            self.village_id, "TWB_PRE_RESOURCE", dict(self.resource_manager.actual)
         )
 
     def manage_reports(self):
@@ -163,7 +170,8 @@ class Village:
         if not self.report_manager:
             self.report_manager = ReportManager(wrapper=self.wrapper, village_id=self.village_id)
 
-        self.report_manager.read(full_run=False)
+        with self.wrapper.scheduler.use(RequestScheduler.BACKGROUND):
+            self.report_manager.read(full_run=False)
 
     def manage_defense(self):
         if not self.game_data:
@@ -230,6 +238,25 @@ class Village:
         if not self.get_village_config(self.village_id, parameter="managed", default=False):
             return False
 
+        build_config = self.get_village_config(
+            self.village_id, parameter="building", default=None
+        )
+        if not build_config:
+            build_config = self.get_config(
+                section="building", parameter="default", default="purple_predator"
+            )
+        template = TemplateManager.get_template(category="builder", template=build_config)
+        if template is None:
+            self.logger.warning("Builder template %s does not exist" % build_config)
+        elif self.builder.set_template(template):
+            self.logger.info("Using builder template %s (%d steps)" % (build_config, len(template)))
+        self.builder.max_lookahead = self.get_config(
+            section="building", parameter="max_lookahead", default=2
+        )
+        self.builder.max_queue_len = self.get_config(
+            section="building", parameter="max_queued_items", default=2
+        )
+
         self.builder.start_update(
             build=self.get_config(
                 section="building", parameter="manage_buildings", default=True
@@ -352,7 +379,8 @@ class Village:
 
         if not self.area:
             self.area = Map(wrapper=self.wrapper, village_id=self.village_id)
-        self.area.get_map()
+        with self.wrapper.scheduler.use(RequestScheduler.BACKGROUND):
+            self.area.get_map()
 
         if not self.attack:
             self.attack = AttackManager(
@@ -421,11 +449,12 @@ class Village:
                 self.get_config(section="market", parameter="auto_trade", default=False)
                 and self.builder.get_level("market")
         ):
-            self.resource_manager.manage_market(
-                drop_existing=self.get_config(
-                    section="market", parameter="auto_remove", default=True
+            with self.wrapper.scheduler.use(RequestScheduler.BACKGROUND):
+                self.resource_manager.manage_market(
+                    drop_existing=self.get_config(
+                        section="market", parameter="auto_remove", default=True
+                    )
                 )
-            )
 
     def manage_attacks(self):
         if not self.game_data:
@@ -454,7 +483,8 @@ class Village:
         if not forced_peace and self.units.can_attack:
             if not self.area:
                 self.area = Map(wrapper=self.wrapper, village_id=self.village_id)
-            self.area.get_map()
+            with self.wrapper.scheduler.use(RequestScheduler.BACKGROUND):
+                self.area.get_map()
 
             if self.area.villages:
                 self.units.can_scout = self.get_config(
@@ -504,6 +534,8 @@ class Village:
             village_id=self.village_id,
             params={"screen": "new_quests", "tab": "main-tab", "quest": 0},
         )
+        if not isinstance(result, dict):
+            return False
         # The data is escaped for JS, so unescape it before sending it to the extractor.
         rewards = Extractor.get_quest_rewards(
             decode(result["response"]["dialog"], "unicode-escape")
@@ -550,12 +582,14 @@ class Village:
             "under_attack": self.def_man.under_attack,
             "last_run": int(time.time()),
         }
-        self.set_cache(self.village_id, entry=village_entry)
+        # snapshot, the managers keep changing their state while the entry is written
+        village_entry = copy.deepcopy(village_entry)
+        self.wrapper.defer(self.set_cache, self.village_id, entry=village_entry)
+        self.wrapper.reporter.add_data(self.village_id, "village", village_entry)
 
     @staticmethod
     def set_cache(village_id, entry):
         t_path = os.path.join(
             os.path.dirname(__file__), "..", "cache", "managed", village_id + ".json"
         )
-        with open(t_path, "w") as f:
-            return json.dump(entry, f)
+        return write_json(t_path, entry)
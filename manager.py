@@ -94,6 +94,8 @@ class VillageManager:
                 data["safe"] = False
                 AttackCache.set_cache(farm, data)
 
+        # one batch for all changes of this run (and of the AttackManagers before it)
+        AttackCache.flush()
         if verbose:
             logger.info("Total loot: %s" % t)
 
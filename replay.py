@@ -0,0 +1,79 @@
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+from core.request import WebWrapper
+from game.village import Village
+
+os.chdir(os.path.dirname(os.path.realpath(__file__)))
+
+
+class Replay:
+    """
+    Runs full village cycles against a recorded session (see bot.record_requests)
+    Usage: python replay.py <archive.jsonl.gz> [cycles]
+    Note: the cycles run like a normal bot run so cache files will be written
+    """
+
+    logger = logging.getLogger("Replay")
+
+    def __init__(self, archive, cycles=1):
+        self.archive = archive
+        self.cycles = cycles
+
+    def run(self):
+        with open("config.json", "r") as f:
+            config = json.load(f)
+        for directory in ["attacks", "reports", "villages", "world", "managed"]:
+            os.makedirs(os.path.join("cache", directory), exist_ok=True)
+
+        wrapper = WebWrapper(
+            config["server"]["endpoint"],
+            server=config["server"]["server"],
+            endpoint=config["server"]["endpoint"],
+            replay_from=self.archive,
+        )
+        wrapper.start()
+        villages = [Village(wrapper=wrapper, village_id=vid) for vid in config["villages"]]
+
+        report_manager = None
+        for cycle in range(self.cycles):
+            for village in villages:
+                if not report_manager:
+                    report_manager = village.report_manager
+                else:
+                    village.report_manager = report_manager
+                wrapper.web.reset_counters()
+                tracemalloc.start()
+                cpu_start = time.process_time()
+                wall_start = time.time()
+                village.run(config=config)
+                cpu = time.process_time() - cpu_start
+                wall = time.time() - wall_start
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                self.logger.info(
+                    "Cycle %d village %s: %d requests (%d missing), cpu %.3fs, wall %.3fs, peak memory %.1f KiB"
+                    % (
+                        cycle,
+                        village.village_id,
+                        wrapper.web.served,
+                        wrapper.web.missing,
+                        cpu,
+                        wall,
+                        peak / 1024,
+                    )
+                )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+    if len(sys.argv) < 2:
+        print("Usage: python replay.py <archive.jsonl.gz> [cycles]")
+        sys.exit(1)
+    Replay(
+        archive=sys.argv[1], cycles=int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    ).run()
@@ -0,0 +1,88 @@
+import json
+import os
+import time
+
+import pytest
+
+from game.attack import AttackCache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    directory = tmp_path / "attacks"
+    directory.mkdir()
+    (directory / "1.json").write_text(json.dumps({"last_attack": 100, "safe": True, "high_profile": False}))
+
+    def path(village_id=None):
+        if village_id is None:
+            return str(directory)
+        return str(directory / (village_id + ".json"))
+
+    monkeypatch.setattr(AttackCache, "path", staticmethod(path))
+    monkeypatch.setattr(AttackCache, "entries", None)
+    monkeypatch.setattr(AttackCache, "dirty", set())
+    monkeypatch.setattr(AttackCache, "last_flush", 0)
+    return directory
+
+
+def stored(directory, vid):
+    with open(str(directory / (vid + ".json"))) as f:
+        return json.load(f)
+
+
+def test_profile_changes_are_batched(cache):
+    assert AttackCache.get_cache("1")["last_attack"] == 100
+    entry = AttackCache.get_cache("1")
+    entry["high_profile"] = True
+    AttackCache.set_cache("1", entry)
+    # loaded just now, the flush interval did not pass
+    assert not stored(cache, "1")["high_profile"]
+    assert AttackCache.dirty == {"1"}
+    assert AttackCache.flush() == 1
+    assert stored(cache, "1")["high_profile"]
+    assert AttackCache.flush() == 0
+
+
+def test_attacks_are_written_right_away(cache):
+    AttackCache.load()
+    deferred = []
+    AttackCache.set_cache("2", {"last_attack": 200, "safe": True}, defer=deferred.append)
+    assert deferred == [AttackCache.flush]
+    deferred[0]()
+    assert stored(cache, "2")["last_attack"] == 200
+
+
+def test_interval_flush(cache):
+    AttackCache.load()
+    AttackCache.last_flush = time.time() - AttackCache.flush_interval - 1
+    AttackCache.set_cache("1", {"last_attack": 100, "safe": False})
+    assert not stored(cache, "1")["safe"]
+
+
+def test_copies_are_not_shared(cache):
+    grabbed = AttackCache.cache_grab()
+    grabbed["1"]["safe"] = False
+    entry = AttackCache.get_cache("1")
+    entry["safe"] = False
+    assert AttackCache.get_cache("1")["safe"]
+    # the caller keeps changing its dict after set_cache
+    AttackCache.set_cache("1", entry)
+    entry["low_profile"] = True
+    assert "low_profile" not in AttackCache.get_cache("1")
+
+
+def test_failed_writes_are_retried(cache, monkeypatch):
+    failures = []
+
+    def write_json(path, entry):
+        failures.append(path)
+        raise OSError("disk full")
+
+    AttackCache.load()
+    monkeypatch.setattr("game.attack.write_json", write_json)
+    AttackCache.set_cache("3", {"last_attack": 300})
+    assert len(failures) == 1
+    assert AttackCache.dirty == {"3"}
+    monkeypatch.setattr("game.attack.write_json", lambda path, entry: True)
+    assert AttackCache.flush() == 1
+    assert not AttackCache.dirty
@@ -0,0 +1,52 @@
+from core.buildingdata import BuildingData
+from core.buildplan import BuildPlan, BuildTemplate
+
+
+LINES = ["# start", "main:2", "wood:1", "stone:1", "main:3", "iron:2"]
+
+
+def test_compile_is_cached():
+    template = BuildTemplate.compile(LINES)
+    assert template.steps == (("main", 2), ("wood", 1), ("stone", 1), ("main", 3), ("iron", 2))
+    assert BuildTemplate.compile(list(LINES)) is template
+    assert template.requirements[1] == BuildingData.cost("wood", 1)
+
+
+def test_cursor_moves_forward():
+    plan = BuildPlan(BuildTemplate.compile(LINES))
+    levels = {"main": 2, "wood": 1}
+    assert plan.remaining(levels) == ["stone:1", "main:3", "iron:2"]
+    assert plan.cursor == 2
+    # steps before the cursor are not checked again, even if the levels are lower
+    assert plan.remaining({}) == ["stone:1", "main:3", "iron:2"]
+    assert plan.lookahead({"stone": 1}, 1) == ["main"]
+    assert plan.cursor == 3
+    assert not plan.has_pending({"main": 3, "iron": 2})
+
+
+def test_unmet_steps_after_the_cursor():
+    plan = BuildPlan(BuildTemplate.compile(LINES))
+    # iron is built already, the template is followed around it
+    assert list(plan.pending({"iron": 2, "main": 2})) == [(1, ("wood", 1)), (2, ("stone", 1)), (3, ("main", 3))]
+
+
+def test_priority_and_dropped_steps():
+    plan = BuildPlan(BuildTemplate.compile(LINES))
+    plan.prioritize("storage", 2)
+    plan.prioritize("storage", 2)
+    levels = {"storage": 1}
+    assert list(plan.pending(levels))[:2] == [(None, ("storage", 2)), (0, ("main", 2))]
+    plan.drop(0, ("main", 2))
+    assert plan.lookahead(levels, 2) == ["storage", "wood"]
+    # the cursor skips the dropped step, met priority steps are removed
+    assert plan.remaining({"storage": 2}) == ["wood:1", "stone:1", "main:3", "iron:2"]
+    assert plan.inserts == []
+
+
+def test_requirement():
+    plan = BuildPlan(BuildTemplate.compile(LINES))
+    template = plan.template
+    assert plan.requirement(0, ("main", 2), {"main": 1}) is template.requirements[0]
+    # several levels away or a priority step: cost of the next level
+    assert plan.requirement(3, ("main", 3), {"main": 1}) == BuildingData.cost("main", 2)
+    assert plan.requirement(None, ("storage", 5), {"storage": 2}) == BuildingData.cost("storage", 3)
@@ -0,0 +1,48 @@
+import io
+
+import pytest
+
+from core import codec
+
+
+@pytest.fixture(autouse=True)
+def active_codec():
+    previous = codec.active
+    yield
+    codec.active = previous
+
+
+@pytest.mark.parametrize("name", sorted(codec.CODECS))
+def test_backends_agree(name):
+    backend = codec.use(name)
+    entry = {"a": [1, 2.5, None, True], "b": {"c": "é/\\u"}}
+    assert backend.loads(backend.dumps(entry)) == entry
+    # control characters inside strings, as sent by the game
+    assert backend.loads('{"a": "line\nbreak"}') == {"a": "line\nbreak"}
+    with pytest.raises(ValueError):
+        backend.loads("{a: 1}")
+
+
+def test_unknown_backend_falls_back():
+    assert codec.use("simdjson") is codec.StdlibCodec
+    assert codec.loads("[1]") == [1]
+
+
+def test_file_helpers():
+    f = io.StringIO()
+    codec.dump({"a": 1}, f)
+    f.seek(0)
+    assert codec.load(f) == {"a": 1}
+
+
+@pytest.mark.parametrize("name", sorted(codec.CODECS))
+def test_write_json_non_ascii(name, tmp_path):
+    from core.storage import write_json
+
+    codec.use(name)
+    path = str(tmp_path / "1.json")
+    write_json(path, {"name": "Wioska Łódź"})
+    with open(path, "rb") as f:
+        assert codec.loads(f.read().decode("utf-8")) == {"name": "Wioska Łódź"}
+    with open(path, "r", encoding="utf-8") as f:
+        assert codec.load(f) == {"name": "Wioska Łódź"}
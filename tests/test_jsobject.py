@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from core import jsobject
+
+
+def test_plain_json():
+    text = '{"a": [1, 2.5, "x"], "b": {"c": null, "d": true}}'
+    assert jsobject.parse(text) == json.loads(text)
+
+
+def test_js_literal():
+    text = """{
+        // comment
+        spear: {name: 'Spear', pop: 1, /* block */ requirements_met: true,},
+        "quoted": [1, 2, ],
+        'single': undefined,
+        10: false
+    }"""
+    assert jsobject.parse(text) == {
+        "spear": {"name": "Spear", "pop": 1, "requirements_met": True},
+        "quoted": [1, 2],
+        "single": None,
+        "10": False,
+    }
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        (r"""{a: 'say "hi"'}""", 'say "hi"'),
+        (r"""{a: 'say \"hi\"'}""", 'say "hi"'),
+        (r"""{a: 'it\'s'}""", "it's"),
+        (r"""{a: 'back\\'}""", "back\\"),
+        (r"""{a: 'back\\"'}""", 'back\\"'),
+        (r"""{a: 'line\nbreak é'}""", "line\nbreak é"),
+        (r"""{a: "say \"hi\""}""", 'say "hi"'),
+    ],
+)
+def test_string_escapes(text, expected):
+    assert jsobject.parse(text) == {"a": expected}
+
+
+def test_single_quoted_key():
+    assert jsobject.parse(r"""{'it\'s "x"': 1}""") == {"it's \"x\"": 1}
+
+
+def test_parse_at():
+    text = 'var data = {a: 1, b: [2]}; TribalWars.init();'
+    value, end = jsobject.parse_at(text, text.index("{"))
+    assert value == {"a": 1, "b": [2]}
+    assert text[end] == ";"
+
+
+def test_error_position():
+    with pytest.raises(jsobject.JSObjectError) as error:
+        jsobject.parse("{a: 1 b: 2}")
+    assert error.value.index == 6
+    assert isinstance(error.value, ValueError)
@@ -0,0 +1,80 @@
+import json
+
+from core.mapstore import MapStore
+
+
+def row(vid, points=100, owner=0, bonus="null"):
+    return (vid, "Village %d" % vid, vid, 500, points, owner, 0, bonus)
+
+
+def test_upsert_writes_changed_rows(tmp_path):
+    store = MapStore(str(tmp_path / "map.db"))
+    assert store.upsert([row(1), row(2)]) == 2
+    assert store.upsert([row(1), row(2)]) == 0
+    assert store.upsert([row(1), row(2, points=200), row(3)]) == 2
+    assert store.get(2) == row(2, points=200)
+    assert store.get("3") == row(3)
+    assert store.get(4) is None
+    assert store.get_many(["1", 4]) == {1: row(1)}
+
+
+def test_reload_after_other_process(tmp_path):
+    path = str(tmp_path / "map.db")
+    bot = MapStore(path)
+    web = MapStore(path)
+    bot.upsert([row(1)])
+    assert web.get(1) == row(1)
+    bot.upsert([row(1, owner=7)])
+    # changes are picked up after the one second check interval
+    web.checked = 0
+    assert web.get(1) == row(1, owner=7)
+    # a new connection reads the same rows from disk
+    assert MapStore(path).get(1) == row(1, owner=7)
+
+
+def test_entries(tmp_path):
+    store = MapStore(str(tmp_path / "map.db"))
+    store.upsert([row(5, owner=3, bonus=json.dumps({"wood": 10}))])
+    entry = store.entries()["5"]
+    assert entry["location"] == [5, 500]
+    assert entry["owner"] == "3"
+    assert entry["bonus"] == {"wood": 10}
+    assert MapStore.entry_to_row(entry)[:7] == row(5, owner=3)[:7]
+
+
+def test_import_files(tmp_path):
+    villages = tmp_path / "villages"
+    villages.mkdir()
+    entry = MapStore.row_to_entry(row(9))
+    (villages / "9.json").write_text(json.dumps(entry))
+    (villages / "broken.json").write_text("{")
+    store = MapStore(str(tmp_path / "map.db"))
+    assert store.import_files(str(villages)) == 1
+    assert store.get(9)[:7] == row(9)[:7]
+    # only once, the store is not empty anymore
+    assert store.import_files(str(villages)) == 0
+
+
+def test_world_map_shares_the_table(tmp_path):
+    from game.map import WorldMap
+
+    path = str(tmp_path / "map.db")
+    store = MapStore(path)
+    store.upsert([row(1)])
+    world = WorldMap(store=store)
+    assert world.table is store.load()
+    assert world.index.find(1, 500) == 0
+
+    # merged villages are written by save, they are in the shared table already
+    assert world.add_row(row(2))
+    world.pending.append(row(2))
+    assert store.upsert([row(2)]) == 0
+    world.save()
+    assert MapStore(path).get(2) == row(2)
+
+    # rows of another process are loaded into the same table and indexed on the next query
+    MapStore(path).upsert([row(3)])
+    store.checked = 0
+    assert store.get(3) == row(3)
+    assert world.table is store.load()
+    assert world.index.find(3, 500) == 2
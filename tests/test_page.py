@@ -0,0 +1,46 @@
+from unittest import mock
+
+from core import codec, jsobject
+from core.page import ParsedPage
+
+
+class Response:
+    def __init__(self, text):
+        self.text = text
+
+
+def test_json_block_uses_codec():
+    page = ParsedPage('<script>BuildingSmith.techs = {"spear": {"level": 1}};</script>')
+    with mock.patch.object(jsobject, "parse_at", wraps=jsobject.parse_at) as parse_at:
+        assert page.literal("smith") == {"spear": {"level": 1}}
+    assert not parse_at.called
+
+
+def test_js_literal_skips_codec():
+    page = ParsedPage("<script>unit_managers.units = {spear: {pop: 1, name: 'Spear'}};</script>")
+    with mock.patch.object(codec, "loads", wraps=codec.loads) as loads:
+        assert page.literal("recruit") == {"spear": {"pop": 1, "name": "Spear"}}
+    assert not loads.called
+
+
+def test_cut_short_json_falls_back():
+    # the closing pattern stops at the first "});" inside the string
+    page = ParsedPage('BuildingSmith.techs = {"a": "x});", "b": 2};')
+    assert page.literal("smith") == {"a": "x});", "b": 2}
+
+
+def test_decoded_blocks_are_memoized():
+    page = ParsedPage('TribalWars.updateGameData({"player": {"id": "1"}});')
+    first = page.json("game_state")
+    assert first == {"player": {"id": "1"}}
+    assert page.json("game_state") is first
+    assert page.scan is page.scan
+
+
+def test_page_per_response():
+    response = Response('<meta content="token" name="csrf-token">')
+    page = ParsedPage.of(response)
+    assert ParsedPage.of(response) is page
+    assert page.csrf == "token"
+    assert ParsedPage.of(None).text == ""
+    assert ParsedPage.of(response.text) is ParsedPage.of(response.text)
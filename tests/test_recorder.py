@@ -0,0 +1,52 @@
+import shutil
+
+from core.recorder import RecordedResponse, ReplaySession, RequestRecorder, request_key
+
+
+def record_pages(path, count=3):
+    recorder = RequestRecorder(str(path))
+    for page in range(count):
+        url = "game.php?village=1&screen=report&from=%d&h=abc" % page
+        recorder.record("GET", url, None, RecordedResponse(url, 200, "page %d" % page))
+    return recorder
+
+
+def test_request_key_ignores_volatile_params():
+    assert request_key("get", "/game.php?screen=main&h=1&village=2") == request_key(
+        "GET", "/game.php?village=2&screen=main&h=2"
+    )
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "session.jsonl.gz"
+    record_pages(path).close()
+
+    session = ReplaySession(str(path))
+    response = session.get("game.php?village=1&screen=report&from=1&h=other")
+    assert response.ok
+    assert response.text == "page 1"
+    # repeated requests get the last recorded response
+    assert session.get("game.php?village=1&screen=report&from=1").text == "page 1"
+    assert not session.get("game.php?village=1&screen=map")
+    assert session.missing == 1
+
+
+def test_unclosed_recording_keeps_records(tmp_path):
+    path = tmp_path / "session.jsonl.gz"
+    recorder = record_pages(path)
+    # copy of the archive while the writer is still open, like a killed bot leaves it
+    killed = tmp_path / "killed.jsonl.gz"
+    shutil.copy(str(path), str(killed))
+    recorder.close()
+
+    session = ReplaySession(str(killed))
+    assert session.get("game.php?village=1&screen=report&from=2").text == "page 2"
+    assert session.missing == 0
+
+
+def test_close_is_idempotent(tmp_path):
+    recorder = record_pages(tmp_path / "session.jsonl.gz", count=1)
+    recorder.close()
+    recorder.close()
+    recorder.record("GET", "x", None, RecordedResponse("x", 200, ""))
+    assert recorder.count == 1
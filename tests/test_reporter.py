@@ -0,0 +1,68 @@
+import json
+import sqlite3
+
+import pytest
+
+from core.reporter import BatchReporter, ReporterObject
+
+
+def test_batch_reporter_is_abstract():
+    with pytest.raises(TypeError):
+        BatchReporter()
+
+
+def test_sqlite_batches(tmp_path):
+    database = str(tmp_path / "twb.db")
+    reporter = ReporterObject(enabled=True, connection_string="sqlite://%s?flush_interval=0.1" % database)
+    reporter.report(1, "TWB_PRE_RESOURCE", {"wood": 10, "stone": 20, "iron": 30, "pop": 5})
+    reporter.report(1, "TWB_BUILD", "main")
+    reporter.add_data(1, "village", {"last_run": 1})
+    reporter.add_data(1, "village", {"last_run": 2})
+    reporter.add_data(2, "village", {"last_run": 3})
+    reporter.close()
+
+    con = sqlite3.connect(database)
+    logs = con.execute("SELECT village_id, action, data FROM twb_logs ORDER BY id").fetchall()
+    assert [(vid, action) for vid, action, _ in logs] == [(1, "TWB_PRE_RESOURCE"), (1, "TWB_BUILD")]
+    assert json.loads(logs[0][2]) == {"wood": 10, "stone": 20, "iron": 30, "pop": 5}
+    assert logs[1][2] == "main"
+    # structured events can be queried
+    assert con.execute(
+        "SELECT json_extract(data, '$.wood') FROM twb_logs WHERE action = 'TWB_PRE_RESOURCE'"
+    ).fetchone() == (10,)
+    assert con.execute("SELECT wood, stone, iron, pop FROM twb_resources").fetchall() == [(10, 20, 30, 5)]
+    # only the latest snapshot per village and data type is kept
+    assert con.execute(
+        "SELECT village_id, json_extract(data, '$.last_run') FROM twb_data ORDER BY village_id"
+    ).fetchall() == [(1, 2), (2, 3)]
+    con.close()
+
+
+def test_disabled_reporter():
+    reporter = ReporterObject()
+    assert reporter.report(1, "TWB_BUILD", "main") is None
+    assert reporter.add_data(1, "village", {}) is None
+
+
+def test_serialize():
+    assert BatchReporter.serialize("main") == "main"
+    assert json.loads(BatchReporter.serialize({"a": [1, "Łódź"]})) == {"a": [1, "Łódź"]}
+    # anything json can not represent is logged as text
+    assert BatchReporter.serialize({1, 2}) == str({1, 2})
+
+
+def test_text_backends_get_json_snapshots():
+    class Backend(BatchReporter):
+        def connect(self, connection):
+            return None
+
+        def write(self, con, batch):
+            return None
+
+    reporter = ReporterObject()
+    reporter.enabled = True
+    reporter.object = Backend()
+    reporter.add_data(1, "village", {"last_run": 2, "name": "Łódź"})
+    kind, (village_id, data_type, data, _) = reporter.object.queue.get_nowait()
+    assert (kind, village_id, data_type) == ("data", 1, "village")
+    assert json.loads(data) == {"last_run": 2, "name": "Łódź"}
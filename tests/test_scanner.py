@@ -0,0 +1,66 @@
+from core.scanner import HTMLScanner, sample_page
+
+
+def test_sample_page():
+    result = HTMLScanner.scan(sample_page(villages=3))
+    assert ("spear", "0") in result.inputs
+    assert ("x", "") in result.inputs and ("cb", "") in result.inputs
+    # rows with a village anchor are not totals
+    assert result.units_total == []
+    assert result.units_home == [
+        ("spear", "0"), ("sword", "0"), ("axe", "0"), ("spy", "0"), ("light", "0"), ("heavy", "0"), ("ram", "0")
+    ]
+    assert result.durations == [1234]
+
+
+def test_markers():
+    page = (
+        '<span class="quickedit-vn" data-id="123">A</span>'
+        '<span class="report-link" data-id="77">Report</span>'
+        '<table id="build_queue"><tr><td><a class="btn btn-cancel" href="#">x</a></td></tr></table>'
+        '<a class="btn btn-cancel" href="#">outside</a>'
+    )
+    result = HTMLScanner.scan(page)
+    assert result.village_ids == ["123"]
+    assert result.report_ids == ["77"]
+    assert result.has_build_queue
+    assert result.build_queue_cancels == 1
+
+
+def test_script_content_is_not_tokenized():
+    page = (
+        "<script>var form = '<input name=\"fake\" value=\"0\">';</script>"
+        "<script>for(i=0;i<n;i++){x()}</script>"
+        '<input name="after_script" value="1">'
+        "<style>a<b{}</style>"
+        '<input name="after_style" value="2">'
+        "<SCRIPT type='text/javascript'>if (a<b && c>d) {}</SCRIPT  >"
+        '<input name="after_upper" value="3">'
+    )
+    assert HTMLScanner.scan(page).inputs == [
+        ("after_script", "1"), ("after_style", "2"), ("after_upper", "3")
+    ]
+
+
+def test_unclosed_script():
+    assert HTMLScanner.scan('<input name="a" value="1"><script>var x = 1 < 2;').inputs == [("a", "1")]
+
+
+def test_unit_cells_with_text():
+    page = (
+        '<table><tr><td class="unit-item unit-item-spear">'
+        '<span class="hidden">x</span> 1.234 5</td></tr></table>'
+    )
+    assert HTMLScanner.scan(page).units_total == [("spear", "5")]
+
+
+def test_quoted_greater_than():
+    page = (
+        '<span class="relative_time" data-title="<b>Arrival</b> in 1h" data-duration="60">1h</span>'
+        "<input name='note' data-tip='a > b' value=\"x\">"
+        '<table><tr><td class="unit-item unit-item-axe" title="<i>Axe</i>">7</td></tr></table>'
+    )
+    result = HTMLScanner.scan(page)
+    assert result.durations == [60]
+    assert result.inputs == [("note", "x")]
+    assert result.units_total == [("axe", "7")]
@@ -0,0 +1,46 @@
+import logging
+
+from core.request import FailedResponse, RequestScheduler, TransportPolicy, WebWrapper
+
+
+def make_wrapper(budget):
+    wrapper = WebWrapper("https://example.invalid/game.php", policy=TransportPolicy(background_budget=budget, cycle_budget=0))
+    wrapper.start_cycle()
+    return wrapper
+
+
+def test_background_budget_warns_once_per_cycle(caplog):
+    wrapper = make_wrapper(budget=1)
+    with caplog.at_level(logging.DEBUG, logger="Requests"):
+        with wrapper.scheduler.use(RequestScheduler.BACKGROUND):
+            assert not wrapper.over_budget("game.php?screen=report")
+            assert wrapper.over_budget("game.php?screen=report&from=12")
+            assert wrapper.over_budget("game.php?screen=report&from=24")
+    warnings = [r for r in caplog.records if r.levelno == logging.WARNING]
+    assert len(warnings) == 1
+    assert "from=12" in warnings[0].getMessage()
+
+    # a new cycle has a fresh budget and warns again
+    caplog.clear()
+    wrapper.start_cycle()
+    with caplog.at_level(logging.WARNING, logger="Requests"):
+        with wrapper.scheduler.use(RequestScheduler.BACKGROUND):
+            assert not wrapper.over_budget("game.php?screen=report")
+            assert wrapper.over_budget("game.php?screen=report&from=12")
+    assert len(caplog.records) == 1
+
+
+def test_urgent_requests_ignore_budget():
+    wrapper = make_wrapper(budget=0)
+    with wrapper.scheduler.use(RequestScheduler.DEFENCE):
+        assert not wrapper.over_budget("game.php?screen=place")
+    with wrapper.scheduler.use(RequestScheduler.BACKGROUND):
+        assert wrapper.over_budget("game.php?screen=map")
+        with wrapper.scheduler.use(RequestScheduler.TIMED):
+            assert not wrapper.over_budget("game.php?screen=place")
+
+
+def test_is_budget():
+    assert FailedResponse.is_budget(FailedResponse("x", FailedResponse.BUDGET))
+    assert not FailedResponse.is_budget(FailedResponse("x", FailedResponse.TIMEOUT))
+    assert not FailedResponse.is_budget(None)
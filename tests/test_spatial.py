@@ -0,0 +1,52 @@
+import random
+
+from core.spatial import SpatialIndex, linear_query
+from core.villagetable import VillageTable
+
+
+def build(villages):
+    index = SpatialIndex(VillageTable(), cell_size=10)
+    for vid, (x, y, points, owner) in villages.items():
+        index.add(vid, x, y, points, owner)
+    return index
+
+
+def test_query_order_and_filters():
+    index = build(
+        {
+            "1": (500, 500, 100, 0),
+            "2": (503, 504, 100, 0),
+            "3": (499, 500, 100, 0),
+            "4": (500, 499, 100, 9),
+            "5": (510, 510, 5000, 0),
+            "6": (520, 500, 100, 0),
+        }
+    )
+    assert index.query(500, 500, 5) == [(0.0, "1"), (1.0, "3"), (5.0, "2")]
+    # owned villages only when included, points strictly within the range
+    assert index.query(500, 500, 1, include=["4"]) == [(0.0, "1"), (1.0, "3"), (1.0, "4")]
+    assert [vid for _, vid in index.query(500, 500, 20, min_points=100)] == ["5"]
+    assert [vid for _, vid in index.query(500, 500, 20, max_points=5000)] == ["1", "3", "2", "6"]
+    assert index.find(503, 504) == 1
+    assert index.find(503, 505) is None
+
+
+def test_moved_village():
+    index = build({"1": (5, 5, 100, 0)})
+    assert index.query(5, 5, 1) == [(0.0, "1")]
+    index.add("1", 55, 5, 100, 0)
+    assert index.query(5, 5, 1) == []
+    assert index.query(55, 5, 1) == [(0.0, "1")]
+    assert len(index) == 1
+
+
+def test_same_as_linear_scan():
+    rng = random.Random(3)
+    villages = {
+        str(vid): (rng.randint(0, 100), rng.randint(0, 100), rng.randint(26, 3000), rng.choice(["0", "0", "12"]))
+        for vid in range(1, 2000)
+    }
+    index = build({vid: (x, y, points, int(owner)) for vid, (x, y, points, owner) in villages.items()})
+    for x, y in [(0, 0), (50, 50), (99, 3), (-5, 40)]:
+        expected = linear_query(villages, x, y, 15, 100, 2000, include=["7"])
+        assert sorted(index.query(x, y, 15, 100, 2000, include=["7"])) == expected
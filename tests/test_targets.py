@@ -0,0 +1,72 @@
+import random
+
+import pytest
+
+from core import targets
+from core.spatial import SpatialIndex
+from core.villagetable import VillageTable
+
+
+@pytest.fixture
+def index():
+    rng = random.Random(5)
+    table = VillageTable()
+    for vid in range(1, 3000):
+        table.set((vid, "", rng.randint(400, 600), rng.randint(400, 600), rng.randint(26, 3000),
+                   0 if rng.random() < 0.4 else rng.randint(1, 50), 0, None))
+    index = SpatialIndex(table)
+    for row in range(len(table)):
+        index.update(row)
+    return index
+
+
+SOURCES = {"1": (500, 500), "2": (450, 560), "3": (0, 0)}
+
+
+def test_fallback_matches_single_queries(index):
+    result = targets.targets_index(index, SOURCES, 20, 100, 2000, include=["17"])
+    assert result["1"] == index.query(500, 500, 20, 100, 2000, include=["17"])
+    assert result["3"] == []
+
+
+def test_numpy_matches_fallback(index):
+    pytest.importorskip("numpy")
+    for radius, low, high, include in [(20, 100, 2000, None), (35, None, None, ["17", "23"]), (5, 0, 50, None)]:
+        expected = targets.targets_index(index, SOURCES, radius, low, high, include)
+        # small blocks split the sources over several distance matrices
+        assert targets.targets_numpy(index.table, SOURCES, radius, low, high, include, block=100) == expected
+        assert targets.targets_numpy(index.table, SOURCES, radius, low, high, include) == expected
+
+
+def test_farm_targets_without_numpy(index, monkeypatch):
+    monkeypatch.setattr(targets, "has_numpy", False)
+    assert targets.farm_targets(index, SOURCES, 10) == targets.targets_index(index, SOURCES, 10)
+    assert targets.farm_targets(index, {}, 10) == {}
+
+
+def test_world_targets_batch(tmp_path, monkeypatch):
+    from core.mapstore import MapStore
+    from game import map as game_map
+
+    world = game_map.WorldMap(store=MapStore(str(tmp_path / "map.db")))
+    world.add_row((1, "", 500, 500, 100, 0, 0, "null"))
+    batches = []
+
+    def farm_targets(index, sources, radius, **kwargs):
+        batches.append(sorted(sources))
+        return targets.farm_targets(index, sources, radius, **kwargs)
+
+    monkeypatch.setattr(game_map, "farm_targets", farm_targets)
+    world.set_sources({"10": (501, 500), "11": (503, 500)})
+    assert world.targets("10", (501, 500), 5) == [(1.0, "1")]
+    assert world.targets("11", (503, 500), 5) == [(3.0, "1")]
+    assert batches == [["10", "11"]]
+    # map changes during the cycle keep the batch, new own villages are added on their own
+    world.add_row((2, "", 502, 500, 100, 0, 0, "null"))
+    assert world.targets("10", (501, 500), 5) == [(1.0, "1")]
+    assert world.targets("12", (502, 501), 5) == [(1.0, "2"), (5 ** 0.5, "1")]
+    assert batches == [["10", "11"], ["12"]]
+    # next cycle
+    world.set_sources(world.sources)
+    assert world.targets("10", (501, 500), 5) == [(1.0, "1"), (1.0, "2")]
+    assert batches[-1] == ["10", "11", "12"]
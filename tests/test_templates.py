@@ -0,0 +1,67 @@
+import copy
+import os
+import pickle
+
+import pytest
+
+from core.templates import FrozenDict, TemplateManager, freeze
+
+
+@pytest.fixture
+def templates(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        TemplateManager,
+        "template_path",
+        staticmethod(lambda category, template: str(tmp_path / category / (template + ".txt"))),
+    )
+    monkeypatch.setattr(TemplateManager, "cache", {})
+    (tmp_path / "builder").mkdir()
+    (tmp_path / "troops").mkdir()
+    return tmp_path
+
+
+def write(path, content, mtime):
+    path.write_text(content)
+    os.utime(str(path), ns=(mtime, mtime))
+
+
+def test_freeze():
+    frozen = freeze({"a": {"b": [1, {"c": 2}]}})
+    assert frozen == {"a": {"b": (1, {"c": 2})}}
+    assert isinstance(frozen["a"], FrozenDict)
+    with pytest.raises(TypeError):
+        frozen["a"]["x"] = 1
+    with pytest.raises(TypeError):
+        frozen.update(x=1)
+    assert copy.deepcopy(frozen) is frozen
+    assert pickle.loads(pickle.dumps(frozen)) == frozen
+    # a plain dict copy can be changed
+    changed = dict(frozen)
+    changed["x"] = 1
+    assert "x" not in frozen
+
+
+def test_parsed_once(templates):
+    write(templates / "builder" / "basic.txt", "main:2\nwood:1\n", 10 ** 9)
+    first = TemplateManager.get_template("builder")
+    assert first == ("main:2", "wood:1")
+    assert TemplateManager.get_template("builder") is first
+
+
+def test_reloaded_on_change(templates):
+    path = templates / "troops" / "basic.txt"
+    write(path, '{"1": {"build": ["main:1"]}}', 10 ** 9)
+    first = TemplateManager.get_template("troops", output_json=True)
+    assert first == {"1": {"build": ("main:1",)}}
+    write(path, '{"1": {"build": ["main:2"]}}', 2 * 10 ** 9)
+    assert TemplateManager.get_template("troops", output_json=True) == {"1": {"build": ("main:2",)}}
+
+
+def test_removed_and_invalidated(templates):
+    path = templates / "builder" / "basic.txt"
+    write(path, "main:2", 10 ** 9)
+    assert TemplateManager.get_template("builder") == ("main:2",)
+    TemplateManager.invalidate("builder")
+    assert not TemplateManager.cache
+    os.remove(str(path))
+    assert TemplateManager.get_template("builder") is None
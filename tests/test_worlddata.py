@@ -0,0 +1,46 @@
+import gzip
+import json
+import os
+
+from core.mapstore import MapStore
+from core.worlddata import WorldData
+from game.map import WorldMap
+
+
+def write_files(directory, villages, mtime):
+    # village.txt: id, name, x, y, player, points, rank
+    (directory / "ally.txt").write_text("5,The+Tribe,TT,1,1,100,100,1\n")
+    (directory / "player.txt").write_text("7,Some+Player,5,1,100,1\n8,Other,0,1,100,2\n")
+    with gzip.open(str(directory / "village.txt.gz"), "wt") as f:
+        f.write("".join("%d,%s,%d,%d,%d,%d,0\n" % village for village in villages))
+    for name in ("ally.txt", "player.txt", "village.txt.gz"):
+        os.utime(str(directory / name), (mtime, mtime))
+
+
+def test_load_writes_changed_villages(tmp_path):
+    store = MapStore(str(tmp_path / "map.db"))
+    # the bonus is only known from the map screen
+    bonus = json.dumps({"wood": 10})
+    store.upsert([(1, "Village 1", 100, 100, 50, 0, 0, bonus)])
+    world = WorldMap(store=store)
+    data = WorldData(str(tmp_path))
+    write_files(tmp_path, [(1, "Village+1", 100, 100, 0, 50), (2, "B%C3%A4r", 101, 100, 7, 80)], 1000)
+
+    assert data.load(store, batch_size=1) == 1
+    assert store.get(1)[7] == bonus
+    assert store.get(2) == (2, "Bär", 101, 100, 80, 7, 5, "null")
+    assert world.villages["2"]["tribe"] == "5"
+    assert data.players[7] == ("Some Player", 5)
+    assert data.tribes[5] == ("The Tribe", "TT")
+
+    # unchanged files are not read again
+    assert data.load(store) == 0
+    write_files(tmp_path, [(1, "Village+1", 100, 100, 8, 60), (2, "B%C3%A4r", 101, 100, 7, 80)], 2000)
+    assert data.load(store) == 1
+    assert store.get(1) == (1, "Village 1", 100, 100, 60, 8, 0, bonus)
+    assert data.updated() == 2000
+
+
+def test_missing_files(tmp_path):
+    store = MapStore(str(tmp_path / "map.db"))
+    assert WorldData(str(tmp_path / "missing")).load(store) == 0
@@ -0,0 +1,81 @@
+import time
+
+from core.mapstore import MapStore
+from core.worlddata import WorldData
+from game.map import Map, WorldMap
+
+
+def entry(vid, points="1.024", owner="0"):
+    return [str(vid), 0, "Village %d" % vid, points, owner, "100", None, 0, 0, 0, 0, "0"]
+
+
+def tile(x, y, villages):
+    # lon -> lat -> village entry
+    vdata = [{} for _ in range(20)]
+    for (dx, dy), value in villages.items():
+        vdata[dx][str(dy)] = value
+    return {"data": {"x": x, "y": y, "villages": vdata}}
+
+
+def world(tmp_path):
+    return WorldMap(store=MapStore(str(tmp_path / "map.db")))
+
+
+def test_merge_skips_fresh_and_unchanged_sectors(tmp_path):
+    shared = world(tmp_path)
+    sector = tile(500, 500, {(1, 2): entry(10), (3, 4): entry(11, owner="7")})
+    assert shared.merge([sector], 10) == [501, 502]
+    assert shared.villages["10"]["points"] == 1024
+    assert shared.villages["11"]["owner"] == "7"
+    assert len(shared.pending) == 2
+    shared.save()
+    assert shared.store.get(11)[5] == 7
+
+    # a second village in the same refresh period does not merge the sector again
+    changed = tile(500, 500, {(1, 2): entry(10, points="2.000")})
+    assert shared.merge([changed], 10) == (501, 502)
+    assert shared.villages["10"]["points"] == 1024
+
+    # outdated, but the same content: nothing is rebuilt
+    shared.sectors = {}
+    shared.merge([sector], 10)
+    assert shared.pending == []
+    shared.sectors = {}
+    shared.merge([changed], 10)
+    assert shared.villages["10"]["points"] == 2000
+    assert len(shared.pending) == 1
+
+
+def test_covers_sectors(tmp_path):
+    shared = world(tmp_path)
+    assert not shared.covers(None)
+    assert not shared.covers((510, 510))
+    now = time.time()
+    for x in (480, 500, 520):
+        for y in (480, 500, 520):
+            shared.sectors[(x, y)] = now
+    assert shared.covers((510, 510))
+    assert not shared.covers((530, 510))
+
+
+def test_covers_world_data(tmp_path):
+    shared = world(tmp_path)
+    shared.world_data = WorldData(str(tmp_path))
+    shared.world_data.mtimes = {"village": time.time()}
+    shared.add_row((1, "Village 1", 510, 510, 100, 0, 0, "null"))
+    assert shared.covers((510, 510))
+    # the village is newer than the world data files
+    assert not shared.covers((300, 300))
+    shared.world_data.mtimes = {"village": time.time() - 9 * 3600}
+    assert not shared.covers((510, 510))
+
+
+def test_map_view_uses_shared_targets(tmp_path):
+    shared = world(tmp_path)
+    for vid, x, owner in [(1, 500, 3), (2, 503, 0), (3, 501, 0), (4, 530, 0)]:
+        shared.add_row((vid, "", x, 500, 100, owner, 0, "null"))
+    view = Map(village_id="1", world=shared)
+    view.set_location((500, 500))
+    assert view.nearby(5) == [(1.0, "3"), (3.0, "2")]
+    assert view.nearby(5, include=["1"]) == [(0.0, "1"), (1.0, "3"), (3.0, "2")]
+    assert view.get_dist((503, 504)) == 5.0
@@ -12,7 +12,8 @@ import traceback
 import coloredlogs
 import requests
 
-from core.request import WebWrapper
+from core.request import TransportPolicy, WebWrapper
+from game.map import WorldMap
 from game.village import Village
 from manager import VillageManager
 from pages.overview import OverviewPage
@@ -243,6 +244,9 @@ class TWB:
             endpoint=config["server"]["endpoint"],
             reporter_enabled=config["reporting"]["enabled"],
             reporter_constr=config["reporting"]["connection_string"],
+            record_to=config["bot"].get("record_requests", None),
+            policy=TransportPolicy.from_config(config["bot"]),
+            background=config["bot"].get("background_worker", True),
         )
 
         self.wrapper.start()
@@ -279,6 +283,7 @@ class TWB:
                 )
                 time.sleep(sleep)
             else:
+                self.wrapper.drain()
                 config = self.config()
                 overview_page, config = self.get_overview(config)
                 has_changed, new_cf = self.get_world_options(overview_page, config)
@@ -290,6 +295,18 @@ class TWB:
                     ) as newcf:
                         json.dump(config, newcf, indent=2, sort_keys=False)
                         print("Deployed new configuration file")
+                if config["world"].get("data_path", None):
+                    # village.txt / player.txt / ally.txt, only read when the files changed
+                    WorldMap.shared().load_world_data(config["world"]["data_path"])
+                world = WorldMap.shared()
+                # farm targets of all known own villages are computed in one batch per cycle
+                world.set_sources(
+                    {
+                        village.village_id: world.map_pos[village.village_id]
+                        for village in self.villages
+                        if village.village_id in world.map_pos
+                    }
+                )
                 vnum = 1
                 for village in self.villages:
                     if overview_page.villages_data and village.village_id not in overview_page.villages_data:
@@ -347,7 +364,13 @@ class TWB:
                 dt_next = dtn + datetime.timedelta(0, sleep)
                 self.runs += 1
 
-                VillageManager.farm_manager(verbose=True)
+                self.wrapper.metrics.dump(
+                    os.path.join(
+                        os.path.dirname(__file__), "cache", "logs", "request_metrics.json"
+                    )
+                )
+                # runs while the bot is sleeping, finished before the next run starts
+                self.wrapper.defer(VillageManager.farm_manager, verbose=True)
                 print(
                     "Dead for %f.2 minutes (next run at: %s)"
                     % (sleep / 60, dt_next.time())
@@ -385,3 +408,6 @@ for x in range(3):
         t.wrapper.reporter.report(0, "TWB_EXCEPTION", str(e))
         print("I crashed :(   %s" % str(e))
         traceback.print_exc()
+    finally:
+        if t.wrapper:
+            t.wrapper.close()
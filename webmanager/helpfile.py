@@ -17,6 +17,13 @@ help_file = {
     'bot.village_name_number_length': 'The number length, lower will be prefixed with zeroes',
     'bot.auto_set_village_names': 'Automatically set villages names',
     'bot.user_agent': 'Set this to the browser agent your session is using (otherwise could cause ban)',
+    'bot.record_requests': 'Record all requests and responses to this file (.jsonl.gz) so cycles can be replayed offline using replay.py',
+    'bot.connect_timeout': 'Seconds to wait for a connection to the game server',
+    'bot.read_timeout': 'Seconds to wait for the game server to respond',
+    'bot.request_retries': 'How often a failed page load is retried (actions are never retried)',
+    'bot.cycle_time_budget': 'Max amount of seconds a single village may spend on requests each run, 0 to disable',
+    'bot.background_request_budget': 'Max requests for reports, map and market per village run so building, recruiting and defence go first',
+    'bot.background_worker': 'Parse reports and write cache files in the background while waiting for the next request',
     'building.manage_buildings': 'Automatically manage buildings',
     'building': 'The automatic creation of buildings',
     'building.default': 'The default template to use, village configs override this variable',
@@ -6,6 +6,8 @@ try:
     from webmanager.helpfile import help_file, buildings
     from webmanager.utils import DataReader, BotManager, MapBuilder, BuildingTemplateManager
 except ImportError:
+    # started from the webmanager directory, core is imported from the repository root
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
     from helpfile import help_file, buildings
     from utils import DataReader, BotManager, MapBuilder, BuildingTemplateManager
 
@@ -131,7 +133,7 @@ def pre_process_village_config(village_id):
 
 def sync():
     reports = DataReader.cache_grab("reports")
-    villages = DataReader.cache_grab("villages")
+    villages = DataReader.map_grab()
     attacks = DataReader.cache_grab("attacks")
     config = DataReader.config_grab()
     managed = DataReader.cache_grab("managed")
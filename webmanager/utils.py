@@ -4,6 +4,9 @@ import collections
 import subprocess
 import psutil
 
+from core.mapstore import MapStore
+from core.templates import TemplateManager
+
 
 class DataReader:
     @staticmethod
@@ -20,7 +23,7 @@ class DataReader:
             if not existing.endswith(".json"):
                 continue
             t_path = os.path.join(os.path.dirname(__file__), "..", "cache", cache_location, existing)
-            with open(t_path, 'r') as f:
+            with open(t_path, 'r', encoding='utf-8') as f:
                 try:
                     output[existing.replace('.json', '')] = json.load(f)
                 except Exception as e:
@@ -30,6 +33,11 @@ class DataReader:
 
         return output
 
+    @staticmethod
+    def map_grab():
+        # the store only reads the database again after the bot changed it
+        return MapStore.shared().entries()
+
     @staticmethod
     def template_grab(template_location):
         output = []
@@ -102,8 +110,9 @@ class BuildingTemplateManager:
         for existing in os.listdir(c_path):
             if not existing.endswith(".txt"):
                 continue
-            with open(os.path.join(os.path.dirname(__file__), "..", "templates", "builder", existing), 'r') as template_file:
-                output[existing] = BuildingTemplateManager.template_to_dict([x.strip() for x in template_file.readlines()])
+            # shared with the bot, files are only parsed again after they have been changed
+            template = TemplateManager.get_template(category="builder", template=existing[:-4])
+            output[existing] = BuildingTemplateManager.template_to_dict(template or [])
         return output
 
     @staticmethod